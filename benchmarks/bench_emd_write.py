@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""Benchmark of the dataset layouts of :meth:`ercpy.formats.emd.EMD.save_to_emd`.
+
+Run with ``python benchmarks/bench_emd_write.py [n_frames] [size]``. A noisy image stack is
+written with every combination of chunking, compression and dtype, reporting the file size, the
+write time and the time for two partial reads: one frame, and a 32 x 32 pixel region through all
+frames.
+
+"""
+
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+import numpy as np
+import h5py
+
+from ercpy.formats.emd import _write_dataset
+
+
+def synthetic_stack(n_frames=64, size=512, counts=100., seed=0):
+    """Poisson noisy stack of slowly drifting Gaussian blobs (like a tomography tilt series)."""
+    rng = np.random.RandomState(seed)
+    yy, xx = np.mgrid[0:size, 0:size] / float(size)
+    centres = rng.uniform(0.2, 0.8, (10, 2))
+    stack = np.empty((n_frames, size, size))
+    for i in range(n_frames):
+        frame = np.zeros((size, size))
+        for cy, cx in centres + 0.002*i:
+            frame += np.exp(-((yy-cy)**2 + (xx-cx)**2) / 0.005)
+        stack[i] = rng.poisson(counts * (1 + frame))
+    return stack
+
+
+def main(n_frames=64, size=512):
+    data = synthetic_stack(n_frames, size)
+    print('Image stack: {} frames of {} x {} pixels ({:.1f} MiB as float64)\n'.format(
+        n_frames, size, size, data.nbytes / 2.**20))
+    layouts = [('contiguous', {'chunks': None}),
+               ('auto chunks', {}),
+               ('auto + lzf', {'compression': 'lzf'}),
+               ('auto + lzf + shuffle', {'compression': 'lzf', 'shuffle': True}),
+               ('auto + gzip', {'compression': 'gzip'}),
+               ('auto + gzip + shuffle', {'compression': 'gzip', 'shuffle': True}),
+               ('auto + gzip + shuffle, float32', {'compression': 'gzip', 'shuffle': True,
+                                                   'dtype': 'float32'})]
+    print('{:<34}{:>12}{:>12}{:>14}{:>14}'.format('layout', 'size [MiB]', 'write [s]',
+                                                  'frame [ms]', 'region [ms]'))
+    tmpdir = tempfile.mkdtemp()
+    try:
+        for label, options in layouts:
+            filename = os.path.join(tmpdir, 'bench.emd')
+            start = time.time()
+            with h5py.File(filename, 'w') as h5_file:
+                _write_dataset(h5_file, 'data', data, 2, **options)
+            duration_write = time.time() - start
+            file_size = os.path.getsize(filename) / 2.**20
+            with h5py.File(filename, 'r') as h5_file:
+                start = time.time()
+                h5_file['data'][n_frames//2]
+                duration_frame = time.time() - start
+            with h5py.File(filename, 'r') as h5_file:  # reopen, so no chunk cache is reused!
+                start = time.time()
+                h5_file['data'][:, size//2:size//2+32, size//2:size//2+32]
+                duration_region = time.time() - start
+            os.remove(filename)
+            print('{:<34}{:>12.1f}{:>12.3f}{:>14.2f}{:>14.2f}'.format(
+                label, file_size, duration_write, 1e3*duration_frame, 1e3*duration_region))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""Benchmark of the import time of :mod:`ercpy` and its parts in fresh interpreters.
+
+Run with ``python benchmarks/bench_import.py [n_runs]``. Every statement is timed in a new
+process (like a spawned pool worker), the median over `n_runs` is reported together with the
+heavy dependencies which were loaded by the statement.
+
+"""
+
+
+import os
+import sys
+import subprocess
+
+import numpy as np
+
+
+STATEMENTS = ['import ercpy',
+              'from ercpy.formats import SemperFormat',
+              'from ercpy.formats import EMD',
+              'from ercpy.eelsedx import VCA_decomposition',
+              'from ercpy.mtools import rm_duds',
+              'from ercpy import *']
+
+HEAVY = ['scipy', 'matplotlib', 'skimage', 'h5py', 'IPython', 'hyperspy']
+
+CODE = '''import sys, time
+import numpy  # baseline, needed by every statement
+start = time.time()
+{}
+duration = time.time() - start
+print(repr((duration, [m for m in {!r} if m in sys.modules])))
+'''
+
+
+def time_statement(statement, n_runs=5):
+    """Median import time (seconds) of `statement` in fresh processes and loaded dependencies."""
+    env = dict(os.environ)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env['PYTHONPATH'] = os.pathsep.join([root, env.get('PYTHONPATH', '')])
+    env.setdefault('MPLBACKEND', 'Agg')
+    durations = []
+    for _ in range(n_runs):
+        output = subprocess.check_output([sys.executable, '-c', CODE.format(statement, HEAVY)],
+                                         env=env)
+        duration, modules = eval(output.strip().splitlines()[-1])
+        durations.append(duration)
+    return np.median(durations), modules
+
+
+def main(n_runs=5):
+    print('{:<46}{:>12}  {}'.format('statement', 'time [ms]', 'heavy dependencies'))
+    for statement in STATEMENTS:
+        duration, modules = time_statement(statement, n_runs)
+        print('{:<46}{:>12.1f}  {}'.format(statement, 1e3*duration, ', '.join(modules)))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
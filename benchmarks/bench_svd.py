@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""Benchmark of the truncated SVD backends of :mod:`ercpy.eelsedx` on synthetic spectrum images.
+
+Run with ``python benchmarks/bench_svd.py [size] [n_channels]``. For every backend the runtime,
+the relative error of the singular values and the largest principal angle between the
+estimated and the exact sub-space (from a full LAPACK SVD) are reported.
+
+"""
+
+
+import sys
+import time
+
+import numpy as np
+
+from ercpy.eelsedx import truncated_svd, VCA_decomposition
+
+
+def synthetic_spectrum_image(size=128, n_channels=1024, n_compo=4, counts=200., seed=0):
+    """Poisson noisy spectrum image of `n_compo` phases with Gaussian edges/peaks on a power law
+    background and smoothly varying abundance maps."""
+    rng = np.random.RandomState(seed)
+    energy = np.linspace(1., 10., n_channels)
+    spectra = np.empty((n_compo, n_channels))
+    for i in range(n_compo):
+        spectrum = 100. * energy**-rng.uniform(2., 4.)  # background
+        for _ in range(3):  # peaks
+            centre, width = rng.uniform(1.5, 9.5), rng.uniform(0.05, 0.3)
+            spectrum += rng.uniform(0.2, 1.) * np.exp(-(energy-centre)**2/(2*width**2))
+        spectra[i] = spectrum / spectrum.sum()
+    yy, xx = np.mgrid[0:size, 0:size] / float(size)
+    maps = np.empty((size, size, n_compo))
+    for i in range(n_compo):
+        cy, cx = rng.uniform(0, 1, 2)
+        maps[..., i] = np.exp(-((yy-cy)**2 + (xx-cx)**2) / 0.05)
+    maps /= maps.sum(axis=-1, keepdims=True)
+    expectation = counts * n_channels * np.dot(maps, spectra)
+    return rng.poisson(expectation).astype(np.float64)
+
+
+def principal_angle(Vt, Vt_ref):
+    """Largest principal angle (in degrees) between the row spaces of `Vt` and `Vt_ref`."""
+    cosines = np.linalg.svd(np.dot(Vt, Vt_ref.T), compute_uv=False)
+    return np.degrees(np.arccos(np.clip(cosines.min(), -1, 1)))
+
+
+def main(size=128, n_channels=1024, nbr_compo=4):
+    data = synthetic_spectrum_image(size, n_channels, nbr_compo)
+    T_data = data.reshape((-1, n_channels))
+    print('Spectrum image: {} x {} pixels, {} channels'.format(size, size, n_channels))
+    start = time.time()
+    _, s_ref, Vt_ref = np.linalg.svd(T_data, full_matrices=False)
+    print('Full LAPACK SVD: {:.3f} s\n'.format(time.time() - start))
+    s_ref, Vt_ref = s_ref[:nbr_compo], Vt_ref[:nbr_compo]
+    print('{:<32}{:>10}{:>16}{:>14}{:>12}'.format('backend', 'time [s]', 'rel. error s',
+                                                  'angle [deg]', 'VCA [s]'))
+    backends = [('arpack', {'covariance': 'pixel'}), ('arpack', {'covariance': 'channel'}),
+                ('randomized', {'n_iter': 0}), ('randomized', {'n_iter': 4}),
+                ('incremental', {'chunk_size': 1024})]
+    for svd_solver, kwargs in backends:
+        if svd_solver == 'arpack' and kwargs['covariance'] == 'pixel' and size > 100:
+            continue  # N_pixels x N_pixels matrix is too large!
+        start = time.time()
+        _, s, Vt = truncated_svd(T_data, nbr_compo, svd_solver, seed=0, **kwargs)
+        duration = time.time() - start
+        error = np.abs(s - s_ref).max() / s_ref[0]
+        angle = principal_angle(Vt, Vt_ref)
+        start = time.time()
+        VCA_decomposition(data, nbr_compo, svd_solver=svd_solver, seed=0,
+                          covariance=kwargs.get('covariance', 'auto'))
+        duration_vca = time.time() - start
+        label = '{} {}'.format(svd_solver, ','.join('{}={}'.format(*kw) for kw in kwargs.items()))
+        print('{:<32}{:>10.3f}{:>16.2e}{:>14.3f}{:>12.3f}'.format(label, duration, error, angle,
+                                                                  duration_vca))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -8,31 +8,53 @@ Modules
 -------
 formats
     # TODO: Add description!
+detector
+    Persistent detector defect maps.
 holography
     # TODO: Add description!
 eelsedx
     # TODO: Add description!
 mtools
     # TODO: Add description!
+cache
+    On-disk caching of analysis results.
+pipeline
+    Frame by frame processing of stacks.
 utils
     # TODO: Add description!
 
 """
 
 
-from .formats import *  # analysis:ignore
-from .holography import *  # analysis:ignore
-from .eelsedx import *  # analysis:ignore
-from .mtools import *  # analysis:ignore
-import config
 from .version import version as __version__
+from . import _lazy
 
 import logging
 _log = logging.getLogger(__name__)
 _log.info("Starting ERCpy V{}".format(__version__))
 del logging
 
+# Submodules (and heavy dependencies like matplotlib, scipy, skimage or h5py) are only imported
+# when they or one of their exported names are accessed for the first time:
+_SUBMODULES = ['formats', 'holography', 'eelsedx', 'mtools', 'detector', 'cache',
+               'pipeline', 'utils', 'config']
+_EXPORTS = {'formats': ['EMD', 'EMDStreamWriter', 'RawSignal', 'SemperFormat', 'FileIndex',
+                        'convert_file', 'convert_directory'],
+            'holography': ['holo_reconstruct', 'unwrap'],
+            'eelsedx': ['Nbr_compotokeep', 'estimate_nbr_compo', 'VCA_decomposition',
+                        'truncated_svd', 'endmember_spectra', 'abundance_maps'],
+            'mtools': ['fft', 'align_img', 'rm_duds'],
+            'detector': ['DefectMap'],
+            'cache': ['ResultCache', 'memoize'],
+            'pipeline': ['Pipeline']}
+
 __all__ = ['utils', 'config']
-__all__.extend(formats.__all__)
-__all__.extend(holography.__all__)
-__all__.extend(eelsedx.__all__)
+__all__.extend(_EXPORTS['formats'])
+__all__.extend(_EXPORTS['holography'])
+__all__.extend(_EXPORTS['eelsedx'])
+__all__.extend(_EXPORTS['detector'])
+__all__.extend(_EXPORTS['cache'])
+__all__.extend(_EXPORTS['pipeline'])
+
+_lazy.install(__name__, _SUBMODULES, {name: submodule for submodule, names in _EXPORTS.items()
+                                      for name in names})
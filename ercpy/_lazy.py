@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+# Copyright 2015 by Forschungszentrum Juelich GmbH
+#
+"""This module provides the lazy loading of the ERCpy subpackages and modules."""
+
+
+import sys
+import types
+import importlib
+
+
+class LazyModule(types.ModuleType):
+
+    '''Module type which imports submodules on the first access of one of their attributes.
+
+    Python 2 has no module level `__getattr__`, so packages replace themselves in `sys.modules`
+    by a :class:`~.LazyModule` (see :func:`~.install`). Submodules and their exported names are
+    imported the first time they are accessed and are cached as normal module attributes.
+
+    Attributes
+    ----------
+    _submodules: list of strings
+        Names of the submodules which are imported on first access.
+    _exports: dictionary
+        Exported names of the submodules with the submodule as value.
+
+    '''
+
+    def __init__(self, module, submodules, exports):
+        super(LazyModule, self).__init__(module.__name__, module.__doc__)
+        self.__dict__.update(module.__dict__)
+        # Python 2 clears the globals of garbage collected modules, keep the original alive:
+        self._module = module
+        self._submodules = submodules
+        self._exports = exports
+
+    def __getattr__(self, name):
+        if name in self._submodules:
+            value = importlib.import_module('.' + name, self.__name__)
+        elif name in self._exports:
+            value = getattr(getattr(self, self._exports[name]), name)
+        else:
+            raise AttributeError("'module' object has no attribute '{}'".format(name))
+        setattr(self, name, value)  # cache, __getattr__ is only called for missing attributes!
+        return value
+
+    def __dir__(self):
+        return sorted(set(self.__dict__) | set(self._submodules) | set(self._exports))
+
+
+def install(name, submodules, exports):
+    '''Replace the module `name` in `sys.modules` by a :class:`~.LazyModule`.
+
+    Parameters
+    ----------
+    name : string
+        The name of the (already imported) package, normally `__name__`.
+    submodules : list of strings
+        Names of the submodules which are imported on first access.
+    exports : dictionary
+        Names which are exported by the package (keys), with the submodule which provides them
+        as values.
+
+    Returns
+    -------
+    module : :class:`~.LazyModule`
+        The lazy module, which is now found in `sys.modules`.
+
+    '''
+    module = LazyModule(sys.modules[name], submodules, exports)
+    sys.modules[name] = module
+    return module
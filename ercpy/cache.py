@@ -0,0 +1,377 @@
+# -*- coding: utf-8 -*-
+# Copyright 2015 by Forschungszentrum Juelich GmbH
+#
+"""This module provides an on-disk, content-addressed cache for the results of analysis steps."""
+
+
+import os
+import json
+import time
+import hashlib
+import zipfile
+import inspect
+import tempfile
+import functools
+
+import numpy as np
+
+from . import config
+from .version import version
+
+import logging
+
+
+__all__ = ['ResultCache', 'memoize']
+_log = logging.getLogger(__name__)
+
+
+class ResultCache(object):
+
+    '''Class for storing results of analysis functions on disk, keyed by their inputs.
+
+    Every result is saved as a `.npz`-file, whose name is a SHA-1 hash of the function, the
+    ERCpy version, the content of all input arrays and all other parameters. Identical inputs
+    therefore lead to the same file, e.g. after a kernel restart. Results can be arrays, scalars,
+    strings, None and (nested) tuples or lists of those. If the total size of the cache exceeds
+    `max_size`, the least recently used results are removed.
+
+    Attributes
+    ----------
+    directory: string
+        The directory of the cached results (created when the first result is stored). If None
+        is given, `config.CACHE_DIR` is used (read on every access, so later changes of the
+        configuration are respected).
+    max_size: int
+        Maximum size of the cache in bytes. If None is given, `config.CACHE_SIZE` is used (also
+        read on every access).
+
+    Notes
+    -----
+    Only functions without side effects should be cached (e.g. no `out` arguments or plots).
+    Functions are identified by their module, name and code (bytecode, constants, referenced
+    names, line number and closure values), so lambdas or redefined functions with the same name
+    do not share results. Arrays are hashed with their dtype, shape and raw bytes (masked arrays
+    also with their mask), hyperspy signals (or other objects with a `data` array) by their class
+    and data. Other objects can not be hashed, functions called with such arguments (or closures
+    over them) are simply evaluated without the cache.
+
+    '''
+
+    _log = logging.getLogger(__name__)
+
+    def __init__(self, directory=None, max_size=None):
+        self._log.debug('Calling __init__')
+        self.directory = directory
+        self.max_size = max_size
+        self._log.debug('Created '+str(self))
+
+    @property
+    def directory(self):
+        '''Directory of the cached results (`config.CACHE_DIR` if not set).'''
+        return self._directory if self._directory is not None else config.CACHE_DIR
+
+    @directory.setter
+    def directory(self, directory):
+        self._directory = directory
+
+    @property
+    def max_size(self):
+        '''Maximum size of the cache in bytes (`config.CACHE_SIZE` if not set).'''
+        return self._max_size if self._max_size is not None else config.CACHE_SIZE
+
+    @max_size.setter
+    def max_size(self, max_size):
+        self._max_size = max_size
+
+    def __repr__(self):
+        return 'ResultCache(directory={!r}, max_size={})'.format(self.directory, self.max_size)
+
+    def __len__(self):
+        return len(self._files())
+
+    def __contains__(self, key):
+        return os.path.exists(self._path(key))
+
+    @property
+    def size(self):
+        '''Total size of all cached results in bytes.'''
+        return sum(size for _, size, _ in self._files())
+
+    def key(self, func, args=(), kwargs={}):
+        '''Calculate the key of a function call.
+
+        Parameters
+        ----------
+        func : function
+            The called function.
+        args : tuple, optional
+            The positional arguments of the call.
+        kwargs : dictionary, optional
+            The keyword arguments of the call.
+
+        Returns
+        -------
+        key : string
+            Hexadecimal SHA-1 hash of the function and its (normalized) arguments. Positional and
+            keyword arguments are bound to the parameter names, default values are included.
+
+        Raises
+        ------
+        TypeError
+            If an argument or a closure value of `func` can not be hashed.
+
+        '''
+        sha1 = hashlib.sha1()
+        sha1.update('{}.{}@{}'.format(func.__module__, func.__name__, version))
+        code = getattr(func, '__code__', None)
+        if code is not None:  # identify the function itself, not only its name:
+            _update_code_hash(sha1, code)
+            sha1.update('closure')
+            _update_hash(sha1, [cell.cell_contents for cell in func.__closure__ or ()])
+        _update_hash(sha1, inspect.getcallargs(func, *args, **kwargs))
+        return sha1.hexdigest()
+
+    def get(self, key):
+        '''Return the cached result of `key` (raises KeyError if it is not in the cache).'''
+        path = self._path(key)
+        if not os.path.exists(path):
+            raise KeyError(key)
+        try:
+            with np.load(path) as archive:
+                structure = json.loads(str(archive['__structure__']))
+                result = _unpack(structure, archive)
+        except (IOError, ValueError, KeyError, EOFError, zipfile.BadZipfile) as e:
+            self._log.warning('Removed corrupt result {} from the cache ({})'.format(key, e))
+            try:
+                os.remove(path)
+            except OSError:  # already removed by another process
+                pass
+            raise KeyError(key)
+        os.utime(path, None)  # mark as recently used!
+        return result
+
+    def set(self, key, result):
+        '''Store `result` under `key` and remove the least recently used results if necessary.'''
+        arrays = {}
+        arrays['__structure__'] = np.array(json.dumps(_pack(result, arrays)))
+        directory = self.directory
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:  # created concurrently by another process
+                if not os.path.isdir(directory):
+                    raise
+        # Write to a temporary file first, so other processes never read incomplete results:
+        handle, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=directory)
+        try:
+            with os.fdopen(handle, 'wb') as tmp_file:
+                np.savez(tmp_file, **arrays)
+            if os.path.exists(self._path(key)):  # Windows can not rename to existing files!
+                os.remove(self._path(key))
+            os.rename(tmp_path, self._path(key))
+        except OSError as e:  # e.g. written concurrently by another process
+            self._log.warning('Could not store result {} ({})'.format(key, e))
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.evict()
+
+    def evict(self):
+        '''Remove the least recently used results until the cache is smaller than `max_size`.
+
+        Returns
+        -------
+        n_removed : int
+            Number of removed results.
+
+        '''
+        files = sorted(self._files())  # oldest first!
+        total = sum(size for _, size, _ in files)
+        n_removed = 0
+        for _, size, path in files:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:  # already removed by another process
+                pass
+            total -= size
+            n_removed += 1
+        if n_removed:
+            self._log.info('Removed {} results from the cache'.format(n_removed))
+        return n_removed
+
+    def clear(self):
+        '''Remove all cached results.'''
+        self._log.debug('Calling clear')
+        for _, _, path in self._files():
+            os.remove(path)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.npz')
+
+    def _files(self):
+        # (last use, size, path) of all cached results:
+        files = []
+        if not os.path.isdir(self.directory):  # nothing stored yet
+            return files
+        for filename in os.listdir(self.directory):
+            if filename.endswith('.npz'):
+                path = os.path.join(self.directory, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:  # removed in the meantime
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+
+_default_cache = None
+
+
+def _get_default_cache():
+    # The default cache is only created when it is used for the first time:
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ResultCache()
+    return _default_cache
+
+
+def memoize(func=None, cache=None):
+    '''Decorator which enables the on-disk caching of the results of a function.
+
+    Parameters
+    ----------
+    func : function
+        The function whose results should be cached.
+    cache : :class:`~.ResultCache`, optional
+        The cache which is used. The default cache is located in `config.CACHE_DIR` and limited
+        to `config.CACHE_SIZE` bytes (both read when the cache is used, the directory is only
+        created when the first result is stored).
+
+    Returns
+    -------
+    wrapper : function
+        The cached function, the original function is available as `wrapper.uncached` and the
+        used :class:`~.ResultCache` as `wrapper.cache`.
+
+    Examples
+    --------
+    >>> from ercpy.holography import holo_reconstruct
+    >>> holo_reconstruct = memoize(holo_reconstruct)
+    >>> wave, phase, amp, rec_param = holo_reconstruct(holo, ref, rec_param)
+
+    or as decorator with a specific cache:
+
+    >>> @memoize(cache=ResultCache('/tmp/cache', max_size=2**28))
+    ... def background(img, sigma=50.):
+    ...     return gaussian_filter(img, sigma)
+
+    '''
+    if func is None:
+        return functools.partial(memoize, cache=cache)
+
+    used_cache = cache if cache is not None else _get_default_cache()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            key = used_cache.key(func, args, kwargs)
+        except TypeError as e:
+            _log.warning('Arguments of {} can not be hashed, cache not used ({})'.format(
+                func.__name__, e))
+            return func(*args, **kwargs)
+        start = time.time()
+        try:
+            result = used_cache.get(key)
+            _log.info('Loaded result of {} from cache in {:.2f} s'.format(
+                func.__name__, time.time()-start))
+            return result
+        except KeyError:
+            pass
+        result = func(*args, **kwargs)
+        try:
+            used_cache.set(key, result)
+        except TypeError as e:
+            _log.warning('Result of {} can not be cached ({})'.format(func.__name__, e))
+        return result
+
+    wrapper.uncached = func
+    wrapper.cache = used_cache
+    return wrapper
+
+
+def _update_code_hash(sha1, code):
+    # Feed a code object (and the code objects of nested functions) into the hash:
+    sha1.update('code{}{!r}{!r}'.format(code.co_firstlineno, code.co_names, code.co_varnames))
+    sha1.update(code.co_code)
+    for const in code.co_consts:
+        if inspect.iscode(const):
+            _update_code_hash(sha1, const)
+        else:  # numbers, strings, None or tuples of those:
+            sha1.update('{}{!r}'.format(type(const).__name__, const))
+
+
+def _update_hash(sha1, value):
+    # Feed the type and content of a (nested) value into the hash:
+    if np.ma.isMaskedArray(value):
+        sha1.update('masked')
+        _update_hash(sha1, np.ma.getdata(value))
+        _update_hash(sha1, np.ma.getmaskarray(value))
+    elif isinstance(value, np.ndarray) and value.dtype != object:
+        sha1.update('ndarray{}{}'.format(value.dtype.str, value.shape))
+        sha1.update(np.ascontiguousarray(value).reshape(-1).view(np.uint8))
+    elif isinstance(getattr(value, 'data', None), np.ndarray):  # e.g. hyperspy signals
+        sha1.update(type(value).__name__)
+        _update_hash(sha1, value.data)
+    elif isinstance(value, dict):
+        sha1.update('dict{}'.format(len(value)))
+        for key in sorted(value):
+            _update_hash(sha1, key)
+            _update_hash(sha1, value[key])
+    elif isinstance(value, (tuple, list)):
+        sha1.update('{}{}'.format(type(value).__name__, len(value)))
+        for item in value:
+            _update_hash(sha1, item)
+    elif value is None or isinstance(value, (bool, int, long, float, complex, basestring,
+                                             np.generic)):
+        sha1.update('{}{!r}'.format(type(value).__name__, value))
+    else:
+        raise TypeError('Objects of type {} can not be hashed!'.format(type(value).__name__))
+
+
+def _pack(value, arrays):
+    # Describe the structure of a result, its arrays and scalars are stored in arrays:
+    if value is None:
+        return ['none']
+    elif isinstance(value, (tuple, list)):
+        return [type(value).__name__, [_pack(item, arrays) for item in value]]
+    elif np.ma.isMaskedArray(value):
+        return ['masked', _pack(np.ma.getdata(value), arrays),
+                _pack(np.ma.getmaskarray(value), arrays)]
+    elif isinstance(value, np.ndarray) and value.dtype != object:
+        name = 'arr_{}'.format(len(arrays))
+        arrays[name] = value
+        return ['array', name]
+    elif isinstance(value, (bool, int, long, float, complex, basestring, np.generic)):
+        name = 'arr_{}'.format(len(arrays))
+        arrays[name] = np.array(value)
+        return ['scalar', name]
+    else:
+        raise TypeError('Objects of type {} can not be cached!'.format(type(value).__name__))
+
+
+def _unpack(structure, archive):
+    # Rebuild a result from its structure and the stored arrays:
+    kind = structure[0]
+    if kind == 'none':
+        return None
+    elif kind == 'tuple':
+        return tuple(_unpack(item, archive) for item in structure[1])
+    elif kind == 'list':
+        return [_unpack(item, archive) for item in structure[1]]
+    elif kind == 'masked':
+        return np.ma.masked_array(_unpack(structure[1], archive), _unpack(structure[2], archive))
+    elif kind == 'array':
+        return archive[structure[1]]
+    else:  # scalar
+        return archive[structure[1]].item()
@@ -8,6 +8,8 @@ Created on Mon Sep 21 13:30:50 2015
 # emd version
 # defaults for user stuff
 
+import os
+
 EMD_VERSION = '0.2'
 
 USER_DEFAULTS = {
@@ -16,3 +18,8 @@ USER_DEFAULTS = {
     'department': u'PGI5/ERC',
     'email': u'j.caron@fz-juelich',
     }
+
+# location and size limit (bytes) of the result cache (see ercpy.cache)
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.ercpy', 'cache')
+
+CACHE_SIZE = 2**30
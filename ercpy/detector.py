@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+# Copyright 2015 by Forschungszentrum Juelich GmbH
+#
+"""This module provides the :class:`~.DefectMap` class for persistent detector defects."""
+
+
+import itertools
+
+import numpy as np
+import h5py
+
+from .mtools import _find_duds
+
+import logging
+
+
+__all__ = ['DefectMap']
+
+
+class DefectMap(object):
+
+    '''Class for storing and correcting persistent detector defects (hot, dead or stuck pixels).
+
+    The :class:`~.DefectMap` is estimated once from a dark or flat (gain) series with the same
+    local median/MAD criterion as :func:`~ercpy.mtools.rm_duds` and only stores the flat indices
+    of the defective pixels. Applying it to a frame replaces these pixels by the mean of their
+    valid neighbours with a single indexed operation, which is much cheaper than a median filter.
+    Transient defects (e.g. X-ray spikes) are not covered and should be removed afterwards with
+    :func:`~ercpy.mtools.rm_duds`. Defect maps can be saved to and loaded from emd-files.
+
+    Attributes
+    ----------
+    shape: tuple
+        Shape of one detector frame.
+    indices: :class:`~numpy.ndarray` (N=1)
+        Sorted flat indices of the defective pixels.
+    radius: int
+        Radius of the neighbourhood which is used for the interpolation.
+
+    '''
+
+    _log = logging.getLogger(__name__)
+
+    def __init__(self, shape, indices, radius=1):
+        self._log.debug('Calling __init__')
+        self.shape = tuple(shape)
+        self.indices = np.unique(np.asarray(indices, dtype=np.int64).ravel())
+        assert self.indices.size == 0 or self.indices[-1] < np.prod(self.shape), \
+            'Defect indices exceed the frame size!'
+        self.radius = radius
+        self._targets, self._neighbours, self._weights = self._build_neighbours()
+        self._log.debug('Created '+str(self))
+
+    def __repr__(self):
+        return 'DefectMap(shape={}, n_defects={}, radius={})'.format(self.shape, len(self),
+                                                                     self.radius)
+
+    def __len__(self):
+        return self.indices.size
+
+    @property
+    def mask(self):
+        '''Boolean map of the defective pixels with the shape of one frame.'''
+        mask = np.zeros(self.shape, dtype=bool)
+        mask.flat[self.indices] = True
+        return mask
+
+    def _build_neighbours(self):
+        self._log.debug('Calling _build_neighbours')
+        # Coordinates of all defects and offsets of the neighbourhood (without the centre):
+        coords = np.array(np.unravel_index(self.indices, self.shape))  # (ndim, n_defects)
+        offsets = [o for o in itertools.product(range(-self.radius, self.radius+1),
+                                                repeat=len(self.shape)) if any(o)]
+        offsets = np.array(offsets, dtype=np.int64).T  # (ndim, n_offsets)
+        nbr_coords = coords[:, :, np.newaxis] + offsets[:, np.newaxis, :]
+        # Neighbours outside of the frame are invalid:
+        valid = np.ones(nbr_coords.shape[1:], dtype=bool)
+        for i, size in enumerate(self.shape):
+            valid &= (nbr_coords[i] >= 0) & (nbr_coords[i] < size)
+            np.clip(nbr_coords[i], 0, size-1, out=nbr_coords[i])
+        neighbours = np.ravel_multi_index(tuple(nbr_coords), self.shape)
+        # Neighbours which are defects themselves are invalid, too:
+        valid &= ~self.mask.flat[neighbours]
+        n_valid = valid.sum(axis=1)
+        if np.any(n_valid == 0):
+            self._log.warning('{} defects have no valid neighbours within a radius of {} and are '
+                              'not corrected!'.format(np.sum(n_valid == 0), self.radius))
+        # Only defects with at least one valid neighbour can be corrected:
+        correctable = n_valid > 0
+        weights = valid[correctable] / n_valid[correctable, np.newaxis].astype(np.float64)
+        return self.indices[correctable], neighbours[correctable], weights
+
+    @classmethod
+    def from_series(cls, series, sigma=8.0, median_k=5, radius=1, frame_ndim=2):
+        '''Estimate a :class:`~.DefectMap` from a dark or flat (gain) series.
+
+        Parameters
+        ----------
+        series : :class:`~numpy.ndarray`
+            Stack of dark or flat frames with the stack along the first axis (a single frame
+            is also accepted).
+        sigma : float, optional
+            Threshold in units of the local robust standard deviation, see
+            :func:`~ercpy.mtools.rm_duds`.
+        median_k : int, optional
+            Size of the median kernel.
+        radius : int, optional
+            Radius of the neighbourhood which is used for the interpolation.
+        frame_ndim : int, optional
+            Number of dimensions of one frame (default 2, e.g. 1 for spectrometer readouts). All
+            leading axes of `series` beyond the frame are treated as the series.
+
+        Returns
+        -------
+        defect_map : :class:`~.DefectMap`
+            The estimated defect map.
+
+        Notes
+        -----
+        The defects are detected on the median frame of the series, so that transient spikes
+        which only occur in single frames are not considered to be persistent.
+
+        '''
+        cls._log.debug('Calling from_series')
+        series = np.asarray(series)
+        assert series.ndim >= frame_ndim, 'The series has less dimensions than one frame!'
+        if series.ndim > frame_ndim:
+            frame = np.median(series.reshape((-1,)+series.shape[-frame_ndim:]), axis=0)
+        else:  # a single frame!
+            frame = series
+        _, duds = _find_duds(frame, sigma, median_k)
+        cls._log.info('Found {} persistent defects'.format(np.sum(duds)))
+        return cls(frame.shape, np.flatnonzero(duds), radius)
+
+    @classmethod
+    def from_mask(cls, mask, radius=1):
+        '''Construct a :class:`~.DefectMap` from a boolean map of defective pixels.
+
+        Parameters
+        ----------
+        mask : :class:`~numpy.ndarray` of bool
+            Map of the defective pixels with the shape of one frame.
+        radius : int, optional
+            Radius of the neighbourhood which is used for the interpolation.
+
+        Returns
+        -------
+        defect_map : :class:`~.DefectMap`
+            The corresponding defect map.
+
+        '''
+        cls._log.debug('Calling from_mask')
+        mask = np.asarray(mask, dtype=bool)
+        return cls(mask.shape, np.flatnonzero(mask), radius)
+
+    def apply(self, data, out=None):
+        '''Replace the defective pixels of a frame or a stack of frames by their neighbours.
+
+        Parameters
+        ----------
+        data : :class:`~numpy.ndarray`
+            A single frame or a stack of frames, the last axes have to match `shape`.
+        out : :class:`~numpy.ndarray`, optional
+            Array in which the result is stored. If None, `data` is modified in place.
+
+        Returns
+        -------
+        out : :class:`~numpy.ndarray`
+            The corrected frame(s).
+
+        '''
+        self._log.debug('Calling apply')
+        ndim = len(self.shape)
+        assert data.shape[-ndim:] == self.shape, 'Frame shape does not match the defect map!'
+        if out is None:
+            out = data
+        elif out is not data:
+            out[...] = data
+        frames = out.reshape((-1, int(np.prod(self.shape))))  # copy if not contiguous!
+        values = frames[:, self._neighbours]  # (n_frames, n_defects, n_offsets)
+        corrected = np.einsum('ijk,jk->ij', values, self._weights)
+        if not np.issubdtype(out.dtype, np.inexact):
+            corrected = np.rint(corrected)
+        frames[:, self._targets] = corrected
+        if not np.may_share_memory(frames, out):
+            out[...] = frames.reshape(out.shape)
+        return out
+
+    def to_emd(self, filename, name='defect_map'):
+        '''Save the :class:`~.DefectMap` in the `defects` group of an emd-file.
+
+        Parameters
+        ----------
+        filename : string
+            The name of the emd-file. The file is created if it does not exist, other groups
+            in an existing file are not touched.
+        name : string, optional
+            The name of the defect map inside of the file. An existing map with the same name
+            is replaced. The default is 'defect_map'.
+
+        Returns
+        -------
+        None
+
+        '''
+        self._log.debug('Calling to_emd')
+        with h5py.File(filename, 'a') as emd_file:
+            defects_group = emd_file.require_group('defects')
+            if name in defects_group:
+                del defects_group[name]
+            group = defects_group.create_group(name)
+            group.create_dataset('indices', data=self.indices, compression='gzip')
+            group.attrs['shape'] = self.shape
+            group.attrs['radius'] = self.radius
+
+    @classmethod
+    def from_emd(cls, filename, name='defect_map'):
+        '''Load a :class:`~.DefectMap` from the `defects` group of an emd-file.
+
+        Parameters
+        ----------
+        filename : string
+            The name of the emd-file.
+        name : string, optional
+            The name of the defect map inside of the file. The default is 'defect_map'.
+
+        Returns
+        -------
+        defect_map : :class:`~.DefectMap`
+            The loaded defect map.
+
+        '''
+        cls._log.debug('Calling from_emd')
+        with h5py.File(filename, 'r') as emd_file:
+            group = emd_file['defects'][name]
+            return cls(group.attrs['shape'], group['indices'][...], int(group.attrs['radius']))
@@ -1,109 +1,573 @@
 import ercpy.utils as ut
 import numpy as np
 import scipy as sc
+from collections import deque
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+from scipy.sparse.linalg import svds
 
-__all__ = ['Nbr_compotokeep', 'VCA_decomposition']
+__all__ = ['Nbr_compotokeep', 'estimate_nbr_compo', 'VCA_decomposition', 'truncated_svd',
+           'endmember_spectra', 'abundance_maps']
 
-from scipy.sparse.linalg import svds
 
 def Nbr_compotokeep(hyperspy_signal, Prcent_to_keep):
     """
-    Calculate the number of components you should use for the decomposition to keep more than "Prcent-to-keep"% of the original data
-    Should be use AFTER decomposition has been performed
+    Calculate the number of components you should use for the decomposition to keep more than
+    "Prcent-to-keep"% of the original data
+    Should be use AFTER decomposition has been performed (see estimate_nbr_compo otherwise)
+
+    Note: the result is the (0-based) index of the last component which has to be kept, i.e.
+    the number of components minus 1 (estimate_nbr_compo returns the number itself)
     """
     i = 0
-    sum_up_to=hyperspy_signal.get_explained_variance_ratio().data[i]
 
-    if (Prcent_to_keep<100):
-	while (sum_up_to<Prcent_to_keep/100):
-		i+=1
-		sum_up_to+=hyperspy_signal.get_explained_variance_ratio().data[i]
-    	if i==0:
-		print "Use larger 'Prcent_to_keep' value to perform the decomposition"
+    if (Prcent_to_keep < 100):
+        cumulative = np.cumsum(hyperspy_signal.get_explained_variance_ratio().data)
+        i = min(np.searchsorted(cumulative, Prcent_to_keep/100.), cumulative.size-1)
+        if i == 0:
+            print("Use larger 'Prcent_to_keep' value to perform the decomposition")
 
     else:
-	print "Keep less than 100% for the decomposition"
+        print("Keep less than 100% for the decomposition")
 
     return i
 
-def VCA_decomposition(hyperspy_signal, nbr_compo, centering, normalization, whitening):
+
+def estimate_nbr_compo(hyperspy_signal, Prcent_to_keep=99.9, max_compo=30, criterion='variance',
+                       centering=False, seed=None):
+    """
+    Estimate the number of components without a prior (full) decomposition
+
+    The largest max_compo singular values are calculated from a randomized low-rank sketch of the
+    data (see truncated_svd), which is much faster than a full decomposition
+
+    Inputs:
+        Data taken from hyperspy_signal.data (or a numpy array with the signal along the last axis)
+        Prcent_to_keep (default 99.9): Percentage of the variance which should be explained
+        max_compo (default 30): Size of the sketch, maximum number of components
+        criterion (default 'variance'):
+            'variance': smallest number of components which explain more than Prcent_to_keep% of
+                the total variance (||T_data||^2, calculated exactly)
+            'noise': number of singular values above the largest singular value expected for
+                pure noise, sigma*(sqrt(N_pixels)+sqrt(N_channels)) (Marchenko-Pastur edge),
+                the noise level sigma is estimated robustly from differences of neighbouring
+                channels (Prcent_to_keep is not used)
+        centering (default False): subtract the mean spectrum before the analysis
+        seed (default None): Seed (integer) of the randomized sketch
+
+    Outputs:
+        nbr_compo: integer, the number of components (Nbr_compotokeep returns the index of the
+            last component instead, which is nbr_compo-1 for the same ratio)
+        ratio: 1D numpy array, cumulative explained variance ratio of the first max_compo
+            components
+    """
+    T_data = _to_2Dnp(hyperspy_signal, 'float64')
+    if centering:
+        T_data -= T_data.mean(axis=0)
+    max_compo = min(max_compo, min(T_data.shape))
+    _, s, _ = truncated_svd(T_data, max_compo, 'randomized', seed)
+    ratio = np.cumsum(s**2)/np.sum(T_data**2)
+
+    if criterion == 'variance':
+        nbr_compo = np.searchsorted(ratio, Prcent_to_keep/100.) + 1
+        if nbr_compo > max_compo:
+            print("%.4g%% of the variance are not explained by %d components, increase "
+                  "'max_compo'" % (Prcent_to_keep, max_compo))
+            nbr_compo = max_compo
+    elif criterion == 'noise':
+        diff = np.diff(T_data, axis=1)
+        sigma = 1.4826*np.median(np.abs(diff - np.median(diff)))/np.sqrt(2)
+        nbr_compo = np.sum(s > sigma*(np.sqrt(T_data.shape[0]) + np.sqrt(T_data.shape[1])))
+    else:
+        raise ValueError("criterion has to be 'variance' or 'noise'!")
+
+    return int(nbr_compo), ratio
+
+
+def VCA_decomposition(hyperspy_signal, nbr_compo, centering=True, normalization=True,
+                      whitening=True, dtype='float64', covariance='auto', svd_solver='arpack',
+                      seed=None, chunk_size=None, n_restarts=1):
     """
     Perform the VCA decomposition of the dataset
 
     Transformation of the data can be performed (using fct_whitening in utils)
 
     Inputs:
-	Data taken from hyperspy_signal.data
-	nbr_compo: Number of dimensions on which you want to decompose your data (integer)
-	Centering (default True): subtract the mean of the vectors along the signal direction
-	Normalization (default True): Normalize the vectors to 1 along the signal direction
-	whitening (default True)
+        Data taken from hyperspy_signal.data (or a numpy array with the signal along the last axis)
+        nbr_compo: Number of dimensions on which you want to decompose your data (integer)
+        Centering (default True): subtract the mean of the vectors along the signal direction
+        Normalization (default True): Normalize the vectors to 1 along the signal direction
+        whitening (default True)
+        dtype (default 'float64'): Floating point precision of the calculation, use 'float32'
+            to halve the memory footprint
+        covariance (default 'auto'): 'pixel' calculates the N_pixels x N_pixels covariance
+            matrix, 'channel' the N_channels x N_channels one (same sub-space, much smaller for
+            spectrum images), 'auto' uses the smaller of both
+        svd_solver (default 'arpack'): 'arpack', 'randomized' or 'incremental', see truncated_svd
+        seed (default None): Seed (integer) for the SVD backend and the endmember search, set
+            it to get reproducible results
+        chunk_size (default None): If set, the data is read in blocks of about chunk_size pixels
+            and never completely loaded (out-of-core, two passes over the data). This is always
+            done for data which are no numpy arrays, e.g. h5py.Dataset of an emd-file (also as
+            data of a hyperspy signal). The covariance is then accumulated in the channel space
+            (svd_solver is not used)
+        n_restarts (default 1): Number of independent (batched) endmember searches, the
+            nbr_compo most frequently found endmembers are used (consensus)
 
     Outputs:
-	Factors: 2D numpy array
+        Factors: 2D numpy array
         Loadings: 2D numpy array
+
+    The decomposition works on a copy, the data of hyperspy_signal is not modified.
+    """
+
+    # The storage of the data (not the type of the signal) decides, e.g. hyperspy signals can
+    # hold h5py datasets or dask arrays:
+    data = hyperspy_signal.data if hasattr(hyperspy_signal, 'axes_manager') else hyperspy_signal
+    if chunk_size is not None or not isinstance(data, np.ndarray):
+        return _VCA_streaming(data, nbr_compo, centering, normalization, whitening, dtype,
+                              chunk_size or 4096, seed, n_restarts)
+
+    # Separate streams, so the SVD backend does not influence the endmember search:
+    rng_svd, rng_search = _split_random_state(seed, 2)
+
+    T_data = _to_2Dnp(data, dtype)
+    _preprocess(T_data, centering, normalization)
+
+    # Projection of the data matrix to the sub-space composed of nbr_compo dimensions
+    U, S, xRot = _pixel_subspace(T_data, nbr_compo, covariance, svd_solver, rng_svd)
+
+    if whitening:
+        epsilon = 0.1
+        xRot *= (1/np.sqrt(S+epsilon))[:, np.newaxis]
+
+    del(S)
+
+    indice = _endmember_indices(xRot, nbr_compo, rng_search, n_restarts)
+
+    return np.dot(U, xRot[:, indice])
+
+
+def _VCA_streaming(dataset, nbr_compo, centering, normalization, whitening, dtype, chunk_size,
+                   seed=None, n_restarts=1):
+    """
+    Out-of-core VCA decomposition, dataset (e.g. h5py.Dataset or numpy.memmap, signal along the
+    last axis) is read twice in blocks of about chunk_size pixels and never loaded completely
+
+    1st pass: accumulate the channel covariance matrix T_data^T.T_data of the preprocessed data
+    2nd pass: project the blocks to the sub-space (see _pixel_subspace) and the endmembers
+    """
+    n_channels = dataset.shape[-1]
+    n_pixels = 0
+    covariance = np.zeros((n_channels, n_channels), dtype=np.float64)
+    for start, stop, block in _iter_pixel_blocks(dataset, chunk_size, dtype):
+        _preprocess(block, centering, normalization)
+        covariance += np.dot(block.T, block)
+        n_pixels = stop
+
+    # Eigenvectors of the channel covariance matrix are the right singular vectors of T_data:
+    subset = (n_channels-nbr_compo, n_channels-1)
+    try:
+        lambdas, V = sc.linalg.eigh(covariance, subset_by_index=subset)
+    except TypeError:  # scipy < 1.5 (eigvals was removed in scipy 1.14)
+        lambdas, V = sc.linalg.eigh(covariance, eigvals=subset)
+    del(covariance)
+    V = V[:, ::-1]
+    V = (V*_svd_signs(V.T)).astype(dtype)
+    s = np.sqrt(np.clip(lambdas[::-1], 0, None)).astype(dtype)
+    S = s**2/n_pixels
+    xRot = s[:, np.newaxis]*V.T
+
+    if whitening:
+        epsilon = 0.1
+        xRot *= (1/np.sqrt(S+epsilon))[:, np.newaxis]
+
+    indice = _endmember_indices(xRot, nbr_compo, _split_random_state(seed, 2)[1], n_restarts)
+
+    # U.xRot[:, indice] = T_data.V/s.xRot[:, indice], applied block by block:
+    s_inv = np.zeros_like(s)
+    s_inv[s > 0] = 1/s[s > 0]  # null directions are dropped
+    projection = np.dot(V*s_inv, xRot[:, indice])
+    result = np.empty((n_pixels, nbr_compo), dtype=dtype)
+    for start, stop, block in _iter_pixel_blocks(dataset, chunk_size, dtype):
+        _preprocess(block, centering, normalization)
+        result[start:stop] = np.dot(block, projection)
+    return result
+
+
+def _iter_pixel_blocks(dataset, chunk_size, dtype=None):
+    """
+    Iterate over dataset (signal along the last axis) in blocks of whole slices along the first
+    axis with about chunk_size pixels, yields (first pixel, last pixel+1, 2D block copy)
+    """
+    if len(dataset.shape) == 1:
+        dataset = dataset[np.newaxis]
+    pixels_per_slice = int(np.prod(dataset.shape[1:-1]))
+    step = max(1, chunk_size//pixels_per_slice)
+    for i in range(0, dataset.shape[0], step):
+        block = np.array(dataset[i:i+step], dtype=dtype).reshape((-1, dataset.shape[-1]))
+        yield i*pixels_per_slice, i*pixels_per_slice+block.shape[0], block
+
+
+def _preprocess(T_data, centering, normalization):
+    """
+    Center and/or normalize the rows of T_data in place
+    """
+    # The row sums are taken before centering, the sum of a centered row vanishes!
+    if normalization:
+        row_sum = T_data.sum(axis=1, keepdims=True)
+
+    if centering:
+        T_data -= T_data.mean(axis=1, keepdims=True)
+
+    if normalization:
+        T_data /= row_sum
+
+
+def _endmember_indices(xRot, nbr_compo, seed=None, n_restarts=1):
+    """
+    Find the indices of the nbr_compo extreme columns of the projected data xRot
+
+    Each new direction is a random vector orthogonal to the endmembers found so far. The
+    orthonormal basis of these endmembers is updated by Gram-Schmidt (QR update) instead of
+    calculating the pseudo inverse in every iteration. n_restarts independent searches are
+    performed batchwise (one matrix product per iteration for all of them), the consensus set
+    consists of the nbr_compo most frequently found indices. If fewer distinct indices were
+    found (e.g. for rank deficient data), the set is filled up with the indices of the first
+    search, so nbr_compo indices are always returned (as for a single search, they can repeat).
+    """
+    rng = _check_random_state(seed)
+    n_dims = xRot.shape[0]
+    # Orthonormal bases (one per restart), zero columns do not contribute to the projection:
+    Q = np.zeros([n_restarts, n_dims, nbr_compo], dtype=np.float64)
+    Q[:, n_dims-1, 0] = 1  # start with the last unit vector (as in the original VCA)
+    indice = np.zeros([n_restarts, nbr_compo], dtype="int")
+
+    for i in range(nbr_compo):
+        w = np.abs(rng.randn(n_restarts, n_dims))
+        f = w - np.einsum('rjk,rk->rj', Q, np.einsum('rjk,rj->rk', Q, w))
+        f /= np.sqrt(np.sum(f**2, axis=1, keepdims=True))
+        v = np.dot(f, xRot)
+        indice[:, i] = np.argmax(np.abs(v), axis=1)
+        # Update the orthonormal basis with the new endmembers:
+        a = xRot[:, indice[:, i]].T.astype(np.float64)
+        if i == 0:
+            Q[:, :, 0] = 0
+        for _ in range(2):  # reorthogonalize once for numerical stability
+            a -= np.einsum('rjk,rk->rj', Q, np.einsum('rjk,rj->rk', Q, a))
+        norm = np.sqrt(np.sum(a**2, axis=1, keepdims=True))
+        Q[:, :, i] = np.where(norm > 1E-12*np.abs(xRot).max(), a/np.where(norm > 0, norm, 1), 0)
+
+    if n_restarts == 1:
+        return indice[0]
+    # Consensus of all restarts, most frequent first:
+    values, counts = np.unique(indice, return_counts=True)
+    consensus = list(values[np.argsort(-counts, kind='mergesort')[:nbr_compo]])
+    fill = [i for i in indice[0] if i not in consensus] + list(indice[0])
+    return np.array(consensus + fill[:nbr_compo-len(consensus)], dtype="int")
+
+
+def _svd_signs(Vt):
+    """
+    Signs which fix the sign ambiguity of singular vectors, the largest entry of each row of Vt
+    is made positive
+    """
+    signs = np.sign(Vt[np.arange(Vt.shape[0]), np.argmax(np.abs(Vt), axis=1)])
+    signs[signs == 0] = 1
+    return signs
+
+
+def endmember_spectra(hyperspy_signal, Ae, chunk_size=4096):
+    """
+    Calculate the endmember spectra from the result of VCA_decomposition (least squares
+    solution pinv(Ae).T_data, accumulated block by block)
+
+    Inputs:
+        Data taken from hyperspy_signal.data (numpy array or h5py.Dataset are accepted, too)
+        Ae: 2D numpy array (N_pixels x nbr_compo), result of VCA_decomposition
+        chunk_size (default 4096): Number of pixels which are processed at once
+
+    Outputs:
+        endmembers: 2D numpy array (nbr_compo x N_channels)
+    """
+    data = hyperspy_signal.data if hasattr(hyperspy_signal, 'axes_manager') else hyperspy_signal
+    AeT_data = np.zeros((Ae.shape[1], data.shape[-1]), dtype=np.float64)
+    for start, stop, block in _iter_pixel_blocks(data, chunk_size):
+        AeT_data += np.dot(Ae[start:stop].T, block)
+    return np.dot(sc.linalg.pinv(np.dot(Ae.T, Ae)), AeT_data)
+
+
+def abundance_maps(hyperspy_signal, endmembers, method='nnls', chunk_size=4096, n_jobs=1,
+                   pool='thread', max_iter=500, tol=1E-6):
+    """
+    Calculate the abundances of the endmember spectra in every pixel
+
+    Every spectrum t is decomposed as t = a.endmembers, the problem is solved for all pixels of a
+    block at once (vectorized), blocks can be distributed over several threads or processes
+
+    Inputs:
+        Data taken from hyperspy_signal.data (numpy array or h5py.Dataset are accepted, too)
+        endmembers: 2D numpy array (nbr_compo x N_channels), e.g. from endmember_spectra
+        method (default 'nnls'):
+            'unconstrained': least squares
+            'sum_to_one': least squares with sum(a) = 1 (closed form)
+            'nnls': non-negative least squares, a >= 0
+            'fcls': fully constrained least squares, a >= 0 and sum(a) = 1
+            The constrained problems are solved by accelerated projected gradient (FISTA) with
+            at most max_iter iterations until the abundances change less than tol
+        chunk_size (default 4096): Number of pixels which are processed at once
+        n_jobs (default 1): Number of workers, at most 2*n_jobs blocks are read ahead (so the
+            data is never loaded completely)
+        pool (default 'thread'): 'thread' or 'process' pool for n_jobs > 1 (numpy releases the
+            GIL for the matrix products, so threads are usually sufficient)
+
+    Outputs:
+        maps: numpy array (nbr_compo x navigation shape), can directly be wrapped as a stack of
+            images, e.g. hyperspy.api.signals.Image(maps)
+    """
+    if method not in ('unconstrained', 'sum_to_one', 'nnls', 'fcls'):
+        raise ValueError("method has to be 'unconstrained', 'sum_to_one', 'nnls' or 'fcls'!")
+    data = hyperspy_signal.data if hasattr(hyperspy_signal, 'axes_manager') else hyperspy_signal
+    endmembers = np.asarray(endmembers, dtype=np.float64)
+    nav_shape = tuple(data.shape[:-1])
+    tasks = ((block, endmembers, method, max_iter, tol)
+             for _, _, block in _iter_pixel_blocks(data, chunk_size, np.float64))
+    if n_jobs > 1:
+        if pool == 'thread':
+            workers = ThreadPool(n_jobs)
+        elif pool == 'process':
+            workers = Pool(n_jobs)
+        else:
+            raise ValueError("pool has to be 'thread' or 'process'!")
+        try:
+            # Pool.imap would consume (read) all blocks at once, submit them in a bounded window:
+            pending, results = deque(), []
+            for task in tasks:
+                if len(pending) >= 2*n_jobs:
+                    results.append(pending.popleft().get())
+                pending.append(workers.apply_async(_abundance_block, (task,)))
+            results.extend(result.get() for result in pending)
+        finally:
+            workers.close()
+            workers.join()
+    else:
+        results = [_abundance_block(task) for task in tasks]
+    maps = np.concatenate(results, axis=0)
+    return maps.T.reshape((endmembers.shape[0],) + nav_shape)
+
+
+def _abundance_block(task):
+    """
+    Solve the abundances of a block of spectra (pixels x channels), task is the tuple
+    (block, endmembers, method, max_iter, tol)
+    """
+    block, endmembers, method, max_iter, tol = task
+    G = np.dot(endmembers, endmembers.T)
+    B = np.dot(block, endmembers.T)
+    G_inv = sc.linalg.pinv(G)
+    a = np.dot(B, G_inv)  # unconstrained least squares
+    if method == 'unconstrained':
+        return a
+    if method in ('sum_to_one', 'fcls'):
+        g = G_inv.sum(axis=1)
+        a -= ((a.sum(axis=1) - 1)/g.sum())[:, np.newaxis]*g
+    if method == 'sum_to_one':
+        return a
+    project = _project_simplex if method == 'fcls' else _project_positive
+    # FISTA for min 1/2 a.G.a^T - B.a^T with the projection onto the constraints:
+    step = 1/np.linalg.eigvalsh(G).max()
+    a = project(a)
+    y = a.copy()
+    t = 1.
+    for _ in range(max_iter):
+        a_old = a
+        a = project(y - step*(np.dot(y, G) - B))
+        t_old, t = t, (1 + np.sqrt(1 + 4*t**2))/2
+        y = a + (t_old - 1)/t*(a - a_old)
+        if np.abs(a - a_old).max() <= tol*max(np.abs(a).max(), 1):
+            break
+    return a
+
+
+def _project_positive(a):
+    """
+    Projection of the rows of a onto the non-negative orthant
+    """
+    return np.maximum(a, 0)
+
+
+def _project_simplex(a):
+    """
+    Euclidean projection of the rows of a onto the probability simplex (a >= 0, sum(a) = 1),
+    see Duchi et al., ICML 2008
+    """
+    n = a.shape[1]
+    u = -np.sort(-a, axis=1)  # descending
+    css = np.cumsum(u, axis=1) - 1
+    rho = np.sum(u - css/np.arange(1, n+1) > 0, axis=1)
+    theta = css[np.arange(a.shape[0]), rho-1]/rho
+    return np.maximum(a - theta[:, np.newaxis], 0)
+
+
+def truncated_svd(T_data, nbr_compo, svd_solver='arpack', seed=None, covariance='auto',
+                  n_oversamples=10, n_iter=4, chunk_size=1024):
     """
+    Calculate the nbr_compo largest singular values and vectors of the 2D data matrix T_data
 
-    T_data = ut.hspy_to_2Dnp(hyperspy_signal)
+    Inputs:
+        T_data: 2D array (N_pixels x N_channels), for svd_solver='incremental' any object which
+            can be sliced along the first axis (e.g. numpy.memmap or h5py.Dataset)
+        nbr_compo: Number of singular values and vectors (integer)
+        svd_solver (default 'arpack'):
+            'arpack': ARPACK (scipy.sparse.linalg.svds) on the covariance matrix chosen by
+                covariance ('pixel', 'channel' or 'auto', see VCA_decomposition)
+            'randomized': randomized SVD (Halko, Martinsson & Tropp, SIAM Rev. 53, 217, 2011)
+                with n_oversamples additional random directions and n_iter power iterations
+            'incremental': rank-(nbr_compo+n_oversamples) SVD which is updated with blocks of
+                chunk_size rows, only one block is held in memory at a time (two passes)
+        seed (default None): Seed (integer) or numpy.random.RandomState for the ARPACK start
+            vector and the randomized range finder, the incremental SVD is deterministic
 
-    if (centering==True):
-	k=0
-	while k < T_data.shape[0]:
-		T_data[k,:]=(T_data[k,:]-np.mean(T_data[k,:]))
-		k +=1
+    The signs of the singular vectors are fixed (largest entry of each row of Vt is positive).
 
-    if (normalization==True):
-	k=0
-	while k < T_data.shape[0]:
-		T_data[k,:]=T_data[k,:]/sum(T_data[k,:])
-		k +=1
+    Outputs:
+        U: 2D numpy array (N_pixels x nbr_compo), left singular vectors
+        s: 1D numpy array, singular values in descending order
+        Vt: 2D numpy array (nbr_compo x N_channels), right singular vectors
+    """
+    rng = _check_random_state(seed)
+    if svd_solver == 'arpack':
+        U, s, Vt = _svd_arpack(T_data, nbr_compo, rng, covariance)
+    elif svd_solver == 'randomized':
+        U, s, Vt = _svd_randomized(T_data, nbr_compo, rng, n_oversamples, n_iter)
+    elif svd_solver == 'incremental':
+        U, s, Vt = _svd_incremental(T_data, nbr_compo, n_oversamples, chunk_size)
+    else:
+        raise ValueError("svd_solver has to be 'arpack', 'randomized' or 'incremental'!")
+    signs = _svd_signs(Vt)
+    return U*signs, s, Vt*signs[:, np.newaxis]
 
-    #Calculate the covariance matrix of T_data
-    sigma = np.dot(T_data,np.transpose(T_data))/T_data[:,1].size
 
-    U, S, V = svds(sigma, k=nbr_compo, which='LM', return_singular_vectors=True)
+def _svd_arpack(T_data, nbr_compo, rng, covariance='auto'):
+    """
+    Truncated SVD from the eigenvectors of T_data.T_data^T (covariance='pixel') or of
+    T_data^T.T_data (covariance='channel'), so the N_pixels x N_pixels matrix is only formed if
+    explicitly requested
+    """
+    n_pixels, n_channels = T_data.shape
+    if covariance == 'auto':
+        covariance = 'channel' if n_channels < n_pixels else 'pixel'
+
+    if covariance == 'pixel':
+        sigma = np.dot(T_data, T_data.T)
+    elif covariance == 'channel':
+        sigma = np.dot(T_data.T, T_data)
+    else:
+        raise ValueError("covariance has to be 'pixel', 'channel' or 'auto'!")
+
+    v0 = rng.uniform(-1, 1, sigma.shape[0]).astype(sigma.dtype)
+    W, S, V = svds(sigma, k=nbr_compo, which='LM', v0=v0, return_singular_vectors=True)
 
     del(sigma)
     del(V)
-    U[:,:nbr_compo] = U[:, nbr_compo-1::-1]
-    S = S[::-1]
-
-    #Projection of the data matrix to the sub-space composed of nbr_compo dimensions
-    xRot = np.dot(np.transpose(U),T_data)
-
-    if (whitening==True):
-	epsilon = 0.1
-    	S_diag = np.empty([S.size,S.size],dtype="float64")
-    	S_diag [:,:] = 0
-    	i=0
-	while i < S.size:
-		S_diag[i,i] = 1/np.sqrt(S[i]+epsilon)
-		i += 1
-	xRot = np.dot(S_diag, xRot)
+    order = np.argsort(S)[::-1]  # descending eigenvalues
+    W = W[:, order]
+    s = np.sqrt(S[order])
+    s_inv = np.zeros_like(s)
+    s_inv[s > 0] = 1/s[s > 0]  # null directions are dropped
 
-    del(S)
-    del(S_diag)
-
-    #Perform the VCA decomposition
-    A = np.empty([nbr_compo,nbr_compo],dtype="float64")
-    A[nbr_compo-1,0]=1
-
-    indice = np.empty([nbr_compo],dtype="int")
-    indice[:]=0
-
-    w = np.empty([nbr_compo,1],dtype="float64")
-    w[:,:]=0
-
-    i=0
-    while (i<nbr_compo):
-	w = np.random.randn(nbr_compo,1)
-	w= abs(w)
-	#f = w-np.dot(np.dot(A,np.linalg.pinv(A)),w) #changed MD 23 oct 2015
-	f = w-np.dot(np.dot(A,sc.linalg.pinv(A)),w)
-	f = f / sc.linalg.norm(f)
-	v = np.dot(np.transpose(f),xRot)
-	indice[i] =  np.argmax(abs(v))
-	A[:,i] = xRot[:,indice[i]]
-	i += 1
-
-    return np.dot(U,xRot[:,indice])
+    if covariance == 'pixel':
+        return W, s, np.dot(W.T, T_data)*s_inv[:, np.newaxis]
+    else:
+        return np.dot(T_data, W)*s_inv, s, W.T
+
+
+def _svd_randomized(T_data, nbr_compo, rng, n_oversamples=10, n_iter=4):
+    """
+    Randomized truncated SVD, the range of T_data is sampled with Gaussian random vectors and
+    refined with (QR-stabilized) power iterations
+    """
+    n_random = min(nbr_compo + n_oversamples, min(T_data.shape))
+    Omega = rng.standard_normal((T_data.shape[1], n_random)).astype(T_data.dtype)
+    Q, _ = sc.linalg.qr(np.dot(T_data, Omega), mode='economic')
+    for _ in range(n_iter):
+        Z, _ = sc.linalg.qr(np.dot(T_data.T, Q), mode='economic')
+        Q, _ = sc.linalg.qr(np.dot(T_data, Z), mode='economic')
+    B = np.dot(Q.T, T_data)
+    Ub, s, Vt = sc.linalg.svd(B, full_matrices=False)
+    return np.dot(Q, Ub[:, :nbr_compo]), s[:nbr_compo], Vt[:nbr_compo]
+
+
+def _svd_incremental(T_data, nbr_compo, n_oversamples=10, chunk_size=1024, preprocess=None):
+    """
+    Incremental truncated SVD over blocks of rows of T_data
+
+    The current rank-r estimate s*Vt is stacked onto the next block and decomposed again, so
+    memory scales with chunk_size*N_channels. The left singular vectors are calculated in a
+    second pass as U = T_data.Vt^T/s. preprocess is an optional function applied to every block.
+    """
+    n_pixels, n_channels = T_data.shape
+    rank = min(nbr_compo + n_oversamples, n_channels)
+    sVt = None
+    for start in range(0, n_pixels, chunk_size):
+        block = np.asarray(T_data[start:start+chunk_size])
+        if preprocess is not None:
+            block = preprocess(block)
+        if sVt is not None:
+            block = np.vstack((sVt, block))
+        _, s, Vt = sc.linalg.svd(block, full_matrices=False)
+        sVt = s[:rank, np.newaxis]*Vt[:rank]
+    s = s[:nbr_compo]
+    Vt = Vt[:nbr_compo]
+    s_inv = np.zeros_like(s)
+    s_inv[s > 0] = 1/s[s > 0]  # null directions are dropped
+    U = np.empty((n_pixels, nbr_compo), dtype=Vt.dtype)
+    for start in range(0, n_pixels, chunk_size):
+        block = np.asarray(T_data[start:start+chunk_size])
+        if preprocess is not None:
+            block = preprocess(block)
+        U[start:start+chunk_size] = np.dot(block, Vt.T)*s_inv
+    return U, s, Vt
+
+
+def _pixel_subspace(T_data, nbr_compo, covariance='auto', svd_solver='arpack', seed=None):
+    """
+    Calculate the nbr_compo main directions U of the pixel covariance matrix
+    T_data.T_data^T/N_pixels, its eigenvalues S and the projection xRot = U^T.T_data
+
+    With the truncated SVD T_data = U.s.Vt, S = s**2/N_pixels and xRot = s*Vt.
+    """
+    U, s, Vt = truncated_svd(T_data, nbr_compo, svd_solver, seed, covariance)
+    return U, s**2/T_data.shape[0], s[:, np.newaxis]*Vt
+
+
+def _check_random_state(seed):
+    """
+    Turn seed (None, integer or numpy.random.RandomState) into a numpy.random.RandomState, None
+    returns the global state of numpy.random (so np.random.seed makes results reproducible)
+    """
+    if seed is None:
+        return np.random.mtrand._rand
+    if isinstance(seed, np.random.RandomState):
+        return seed
+    return np.random.RandomState(seed)
+
+
+def _split_random_state(seed, n_streams):
+    """
+    Derive n_streams independent numpy.random.RandomState objects from seed (see
+    _check_random_state), so steps which draw a different amount of random numbers (e.g.
+    depending on the SVD backend) do not change the random numbers of the following steps
+    """
+    rng = _check_random_state(seed)
+    return [np.random.RandomState(s) for s in rng.randint(0, 2**31-1, size=n_streams)]
+
+
+def _to_2Dnp(data, dtype=None):
+    """
+    Return a 2D copy of data (hyperspy signal or numpy array), with the 2nd dimension being the
+    signal dimension
+    """
+    if hasattr(data, 'axes_manager'):  # hyperspy signal
+        data = data.data
+    return ut.unfold(np.array(data, dtype=dtype))  # copy, so unfolding is always a view
@@ -5,9 +5,19 @@
 """Subpackage for handling file import, export and conversions."""
 
 
-from .emd import *  # analysis:ignore
-from .semper import *  # analysis:ignore
+from .. import _lazy
 
+# The format modules are only imported when they or one of their exported names are accessed
+# for the first time (e.g. SemperFormat does not need h5py):
+_EXPORTS = {'emd': ['EMD', 'EMDStreamWriter', 'RawSignal'],
+            'semper': ['SemperFormat'],
+            'index': ['FileIndex'],
+            'convert': ['convert_file', 'convert_directory']}
 
-__all__ = emd.__all__
-__all__.extend(semper.__all__)
+__all__ = list(_EXPORTS['emd'])
+__all__.extend(_EXPORTS['semper'])
+__all__.extend(_EXPORTS['index'])
+__all__.extend(_EXPORTS['convert'])
+
+_lazy.install(__name__, list(_EXPORTS), {name: submodule for submodule, names in _EXPORTS.items()
+                                         for name in names})
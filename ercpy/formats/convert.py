@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+# Copyright 2015 by Forschungszentrum Juelich GmbH
+#
+"""This module provides functions for the batch conversion between Semper and EMD files."""
+
+
+import os
+import time
+import argparse
+from time import strftime
+from multiprocessing import Pool
+
+import numpy as np
+import h5py
+
+from .emd import EMD, _default_chunks, _write_axes, _write_version
+from .semper import SemperFormat
+
+import logging
+
+
+__all__ = ['convert_file', 'convert_directory']
+_log = logging.getLogger(__name__)
+
+
+EXTENSIONS = {'emd': '.emd', 'unf': '.unf'}
+
+
+def convert_file(filename, target, output_dir=None, overwrite=False, compression=None):
+    '''Convert a Semper file to an emd-file or the signals of an emd-file to Semper files.
+
+    Parameters
+    ----------
+    filename : string
+        The name of the `.unf`- or `.emd`-file which should be converted.
+    target : {'emd', 'unf'}
+        The target format.
+    output_dir : string, optional
+        The directory of the converted files. The default is the directory of `filename`.
+    overwrite : boolean, optional
+        If True, existing files are overwritten, otherwise (default) they are skipped.
+    compression : {None, 'gzip', 'lzf'}, optional
+        Compression filter of the emd-datasets (with byte shuffling), see
+        :func:`~ercpy.formats.emd.EMD.save_to_emd`.
+
+    Returns
+    -------
+    filenames : list of strings
+        The names of the written files (Semper files hold only one signal, so an emd-file with
+        several signals is converted to several files `<name>_<signal>.unf`).
+
+    Notes
+    -----
+    Semper files are converted without loading the complete picture: the file is memory mapped
+    and copied layer by layer into a chunked dataset. Signals of emd-files are read one at a
+    time. The `dim` datasets of the emd-files are assumed to follow the axis order of the data
+    (`dim1` is the first axis), Semper x, y and z correspond to columns, rows and layers.
+
+    '''
+    _log.debug('Calling convert_file')
+    filename = os.path.abspath(filename)
+    if output_dir is None:
+        output_dir = os.path.dirname(filename)
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    if target == 'emd':
+        output = os.path.join(output_dir, stem + EXTENSIONS['emd'])
+        if os.path.exists(output) and not overwrite:
+            _log.info('Skipped existing file {}'.format(output))
+            return []
+        _unf_to_emd(filename, output, stem, compression)
+        return [output]
+    elif target == 'unf':
+        outputs = []
+        with h5py.File(filename, 'r') as emd_file:
+            data_group = emd_file.get('data', {})
+            for name, group in data_group.iteritems():
+                if isinstance(group, h5py.Group) and group.attrs.get('emd_group_type') == 1:
+                    unf_name = '{}_{}{}'.format(stem, name, EXTENSIONS['unf'])
+                    output = os.path.join(output_dir, unf_name)
+                    if os.path.exists(output) and not overwrite:
+                        _log.info('Skipped existing file {}'.format(output))
+                        continue
+                    _group_to_unf(name, group, output)
+                    outputs.append(output)
+        return outputs
+    else:
+        raise ValueError("Target format has to be 'emd' or 'unf'!")
+
+
+def _unf_to_emd(filename, output, name, compression=None):
+    # Copy the memory mapped picture data layer by layer into a new emd-file:
+    semper = SemperFormat.from_file(filename, lazy=True)
+    data = semper.data  # (layers, rows, columns)
+    axes = [{'name': axis_name, 'units': units or None, 'offset': offset, 'scale': scale}
+            for axis_name, units, offset, scale
+            in zip('xyz', semper.units, semper.offsets, semper.scales)][::-1]
+    shape = data.shape
+    if shape[0] == 1:  # single layer, write an image!
+        shape, axes = shape[1:], axes[1:]
+    signal_ndim = 1 if SemperFormat.ICLASS_DICT.get(semper.iclass) == 'spectrum' else 2
+    with h5py.File(output, 'w') as emd_file:
+        _write_version(emd_file)
+        group = emd_file.create_group('data').create_group(name)
+        dataset = group.create_dataset('data', shape=shape, dtype=data.dtype,
+                                       chunks=_default_chunks(shape, min(signal_ndim, len(shape)),
+                                                              data.dtype.itemsize),
+                                       compression=compression,
+                                       shuffle=compression is not None)
+        if len(shape) == 2:
+            dataset[...] = data[0]
+        else:
+            for k in range(shape[0]):
+                dataset[k] = data[k]
+        _write_axes(group, axes)
+        group.attrs['emd_group_type'] = 1
+        group.attrs['record_by'] = SemperFormat.ICLASS_DICT.get(semper.iclass, '')
+        group.attrs['title'] = semper.title
+        if semper.date is not None:
+            group.attrs['date'] = semper.date
+
+
+def _group_to_unf(name, group, output):
+    # Write a signal group of an emd-file as a Semper file:
+    data, axes, metadata = EMD._read_group(group)
+    _arrays_to_unf(name, data, axes, metadata, output)
+
+
+def _arrays_to_unf(name, data, axes, metadata, output):
+    # Write data with the calibration and metadata of a signal group as a Semper file:
+    data = np.asarray(data)
+    assert data.ndim <= 3, 'Only up to 3-dimensional datasets can be written to Semper files!'
+    if np.issubdtype(data.dtype, np.complexfloating):
+        iform = 3  # complex
+    elif np.issubdtype(data.dtype, np.floating):
+        iform = 2  # float
+    elif np.issubdtype(data.dtype, np.integer) or data.dtype == np.bool_:
+        iform = 1  # int
+    else:
+        raise TypeError('Data type {} can not be written to Semper files!'.format(data.dtype))
+    data = data.astype(SemperFormat.IFORM_DICT[iform]).reshape((1,)*(3-data.ndim) + data.shape)
+    axes = list(reversed(axes)) + [{}]*(3-len(axes))  # (x, y, z)
+    arg_dict = {}
+    arg_dict['data'] = data
+    arg_dict['title'] = metadata.get('title', name)
+    arg_dict['offsets'] = tuple(axis.get('offset', 0.) for axis in axes)
+    arg_dict['scales'] = tuple(axis.get('scale', 1.) for axis in axes)
+    arg_dict['units'] = tuple(axis.get('units', '') for axis in axes)
+    arg_dict['date'] = strftime('%Y-%m-%d %H:%M:%S')
+    arg_dict['ICLASS'] = SemperFormat.ICLASS_DICT_INV.get(metadata.get('record_by'), 6)
+    arg_dict['IFORM'] = iform
+    arg_dict['IVERSN'] = 2  # current standard
+    arg_dict['ILABEL'] = 1  # True
+    arg_dict['IFORMAT'] = None  # not needed
+    arg_dict['IWP'] = 0  # seems standard
+    arg_dict['IPLTYP'] = 248  # seems standard
+    arg_dict['ICCOLN'] = data.shape[2]//2 + 1
+    arg_dict['ICROWN'] = data.shape[1]//2 + 1
+    arg_dict['ICLAYN'] = data.shape[0]//2 + 1
+    SemperFormat(arg_dict).to_file(output)
+
+
+def _convert_task(args):
+    # Worker of convert_directory (has to be picklable), errors are returned, not raised:
+    filename = args[0]
+    start = time.time()
+    try:
+        outputs = convert_file(*args)
+        return filename, outputs, os.path.getsize(filename), time.time()-start, None
+    except Exception as e:
+        return filename, [], 0, time.time()-start, '{}: {}'.format(type(e).__name__, e)
+
+
+def convert_directory(source, destination, target='emd', n_processes=None, overwrite=False,
+                      compression=None):
+    '''Convert all Semper or EMD files in a directory tree in parallel.
+
+    Parameters
+    ----------
+    source : string
+        The root directory of the files which should be converted. With `target` 'emd' all
+        `.unf`-files are converted, with `target` 'unf' all `.emd`-files.
+    destination : string
+        The root directory of the converted files, the directory structure of `source` is
+        reproduced.
+    target : {'emd', 'unf'}, optional
+        The target format. The default is 'emd'.
+    n_processes : int, optional
+        Number of worker processes. The default (None) uses one process per CPU, 1 converts the
+        files in the current process.
+    overwrite : boolean, optional
+        If True, existing files are overwritten, otherwise (default) they are skipped.
+    compression : {None, 'gzip', 'lzf'}, optional
+        Compression filter of the emd-datasets, see :func:`~.convert_file`.
+
+    Returns
+    -------
+    stats : dict
+        Summary of the conversion with the number of converted (`n_files`) and written
+        (`n_written`) files, the converted amount of data (`bytes`), the wall time (`seconds`),
+        the throughput (`throughput`, bytes per second) and the list of `failed` files with
+        their error messages.
+
+    '''
+    _log.debug('Calling convert_directory')
+    assert target in EXTENSIONS, "Target format has to be 'emd' or 'unf'!"
+    extension = EXTENSIONS['unf' if target == 'emd' else 'emd']
+    tasks = []
+    for root, _, filenames in os.walk(source):
+        output_dir = os.path.join(destination, os.path.relpath(root, source))
+        for filename in sorted(filenames):
+            if os.path.splitext(filename)[1].lower() == extension:
+                if not os.path.exists(output_dir):
+                    os.makedirs(output_dir)
+                tasks.append((os.path.join(root, filename), target, output_dir, overwrite,
+                              compression))
+    start = time.time()
+    if n_processes == 1:
+        results = map(_convert_task, tasks)
+    else:
+        workers = Pool(n_processes)
+        try:
+            results = []
+            for result in workers.imap_unordered(_convert_task, tasks):
+                results.append(result)
+                _log.info('Converted {} in {:.2f} s'.format(result[0], result[3]))
+        finally:
+            workers.close()
+            workers.join()
+    duration = time.time() - start
+    failed = [(filename, error) for filename, _, _, _, error in results if error is not None]
+    for filename, error in failed:
+        _log.error('Could not convert {} ({})!'.format(filename, error))
+    n_bytes = sum(result[2] for result in results)
+    stats = {'n_files': len(results) - len(failed),
+             'n_written': sum(len(result[1]) for result in results),
+             'bytes': n_bytes,
+             'seconds': duration,
+             'throughput': n_bytes / duration if duration > 0 else float('inf'),
+             'failed': failed}
+    _log.info('Converted {} files ({:.1f} MiB) in {:.2f} s ({:.1f} MiB/s), {} failed'.format(
+        stats['n_files'], n_bytes/2.**20, duration, stats['throughput']/2.**20, len(failed)))
+    return stats
+
+
+def main(argv=None):
+    '''Console entry point `ercpy-convert`, see `ercpy-convert --help`.'''
+    parser = argparse.ArgumentParser(prog='ercpy-convert',
+                                     description='Convert directory trees between Semper (.unf) '
+                                                 'and EMD (.emd) files.')
+    parser.add_argument('source', help='root directory of the files to convert')
+    parser.add_argument('destination', help='root directory of the converted files')
+    parser.add_argument('--to', dest='target', choices=['emd', 'unf'], default='emd',
+                        help='target format (default: emd)')
+    parser.add_argument('-j', '--processes', type=int, default=None,
+                        help='number of worker processes (default: one per CPU)')
+    parser.add_argument('--compression', choices=['gzip', 'lzf'], default=None,
+                        help='compression filter of the emd-datasets')
+    parser.add_argument('--overwrite', action='store_true', help='overwrite existing files')
+    args = parser.parse_args(argv)
+    stats = convert_directory(args.source, args.destination, args.target, args.processes,
+                              args.overwrite, args.compression)
+    print('Converted {} files ({} written) in {:.2f} s: {:.1f} MiB, {:.1f} MiB/s'.format(
+        stats['n_files'], stats['n_written'], stats['seconds'], stats['bytes']/2.**20,
+        stats['throughput']/2.**20))
+    for filename, error in stats['failed']:
+        print('FAILED {}: {}'.format(filename, error))
+    return 1 if stats['failed'] else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -5,7 +5,9 @@
 """This module provides the :class:`~.EMD` class for storing of electron microscopy datasets."""
 
 
+import os
 import re
+import numpy as np
 import h5py
 
 from .. import config
@@ -13,7 +15,7 @@ from .. import config
 import logging
 
 
-__all__ = ['EMD']
+__all__ = ['EMD', 'EMDStreamWriter', 'RawSignal']
 
 
 class EMD(object):
@@ -62,72 +64,117 @@ class EMD(object):
                 sample[key] = ''
         self.sample = sample
         self.comments = comments
+        self._emd_file = None  # only kept open for lazy loading!
+        self._raw = False  # signals are loaded as RawSignal instances if True!
         # Make sure the signals are added properly to data:
         self.data = {}
         for name, signal in data.iteritems():
             self.add_signal(name, signal)
 
-    def _write_signal_to_group(self, data_group, signal):
+    def _write_signal_to_group(self, data_group, signal, **options):
         self._log.debug('Calling _write_signal_to_group')
-        # Save data:
+        if isinstance(signal, RawSignal):  # no hyperspy needed!
+            dataset = data_group.create_group(signal.name)
+            _write_dataset(dataset, 'data', signal.data, signal.signal_ndim, **options)
+            _write_axes(dataset, signal.axes)
+            for key, value in signal.metadata.iteritems():
+                dataset.attrs[key] = value
+            dataset.attrs['emd_group_type'] = 1
+            return
+        # Save data (options are passed to _write_dataset):
         dataset = data_group.create_group(signal.metadata.General.title)
-        dataset['data'] = signal.data
+        _write_dataset(dataset, 'data', signal.data, signal.axes_manager.signal_dimension,
+                       **options)
         # Iterate over all dimensions:
+        from traits.trait_base import _Undefined
+        axes = []
         for i in range(len(signal.data.shape)):
-            # TODO: What about longer dim?
-            key = 'dim{}'.format(i+1)
-            offset = signal.axes_manager[i].offset
-            scale = signal.axes_manager[i].scale
-            dim = dataset.create_dataset(key, data=[offset, offset+scale])
-            name = signal.axes_manager[i].name
-            from traits.trait_base import _Undefined
-            if type(name) is _Undefined:
-                name = ''
-            dim.attrs['name'] = name
-            units = signal.axes_manager[i].units
-            if type(units) is _Undefined:
-                units = ''
-            else:
-                units = '[{}]'.format('_'.join(list(units)))
-            dim.attrs['units'] = units
-            # TODO: What if units is not one or two characters long? More _? E.g. keV?
+            axis = {'offset': signal.axes_manager[i].offset,
+                    'scale': signal.axes_manager[i].scale}
+            for key in ['name', 'units']:
+                value = getattr(signal.axes_manager[i], key)
+                axis[key] = None if type(value) is _Undefined else value
+            axes.append(axis)
+        _write_axes(dataset, axes)
         # Write metadata:
         for key, value in signal.metadata.Signal:
             dataset.attrs[key] = value
 
     def _read_signal_from_group(self, name, group):
         self._log.debug('Calling _read_signal_from_group')
+        data, axes, metadata = self._read_group(group)
+        if self._raw:
+            signal = RawSignal(name, data, axes, metadata)
+        else:
+            signal = self._create_signal(data, axes, metadata)
+        # Add signal:
+        self.add_signal(name, signal, metadata)
+
+    @classmethod
+    def _read_group(cls, group, roi=None):
+        # Read the data (or the hyperslab given by roi), the calibration of the remaining axes
+        # and the metadata of a signal group:
+        dataset = group.get('data')
+        axes = cls._read_axes(group)
+        if roi is None:
+            data = dataset[...]
+        else:
+            roi = _normalize_roi(roi, dataset.shape)
+            data = dataset[roi]
+            axes = [_slice_axis(axis, index) for axis, index in zip(axes, roi)
+                    if isinstance(index, slice)]  # integer indices remove their axis!
+        # Extract metadata:
+        metadata = {}
+        for key, value in group.attrs.iteritems():
+            metadata[key] = value
+        return data, axes, metadata
+
+    @classmethod
+    def _create_signal(cls, data, axes, metadata):
         import hyperspy.api as hp
-        # Extract essential data:
-        data = group.get('data')[...]
-        record_by = group.attrs.get('record_by', '')
+        record_by = metadata.get('record_by', '')
         # Create Signal, Image or Spectrum:
-        if record_by == 'spectrum':
+        if record_by == 'spectrum' and len(data.shape) >= 1:
             signal = hp.signals.Spectrum(data)
-        if record_by == 'image':
+        elif record_by == 'image' and len(data.shape) >= 2:
             signal = hp.signals.Image(data)
         else:
             signal = hp.signals.Signal(data)
         # Set signal properties:
-        signal.set_signal_origin = group.attrs.get('signal_origin', '')
-        signal.set_signal_type = group.attrs.get('signal_type', '')
+        signal.set_signal_origin = metadata.get('signal_origin', '')
+        signal.set_signal_type = metadata.get('signal_type', '')
         # Iterate over all dimensions:
-        for i in range(len(data.shape)):
+        for i, axis in enumerate(axes):
+            for key in ['name', 'units', 'scale', 'offset']:
+                if key in axis:
+                    setattr(signal.axes_manager[i], key, axis[key])
+            if axis.get('values') is not None:
+                cls._log.warning('Axis {} is non-uniform, hyperspy uses the first step as '
+                                 'scale!'.format(i))
+        return signal
+
+    @classmethod
+    def _read_axes(cls, group):
+        # Read the calibration of all dimensions (the data itself is not touched). Compact dim
+        # datasets hold [offset, offset+scale], explicit ones the complete axis vector, which is
+        # kept as 'values' if the axis is non-uniform. Scale and offset are omitted if they can
+        # not be calculated (hyperspy uses defaults (1.0 and 0.0) in that case):
+        axes = []
+        for i, size in enumerate(group['data'].shape):
             dim = group.get('dim{}'.format(i+1))
-            signal.axes_manager[i].name = dim.attrs.get('name', '')
             units = re.findall('[^_\W]+', dim.attrs.get('units', ''))
-            signal.axes_manager[i].units = ''.join(units)
+            axis = {'name': dim.attrs.get('name', ''), 'units': ''.join(units), 'size': size}
             try:
-                signal.axes_manager[i].scale = dim[1] - dim[0]  # TODO: What about longer dim?
-                signal.axes_manager[i].offset = dim[0]
-            except (IndexError, TypeError) as e:  # Hyperspy uses defaults (1.0 and 0.0)!
-                self._log.warning('Could not calculate scale/offset of axis {}: {}'.format(i, e))
-        # Extract metadata:
-        metadata = {}
-        for key, value in group.attrs.iteritems():
-            metadata[key] = value
-        # Add signal:
-        self.add_signal(name, signal, metadata)
+                vector = dim[...]
+                axis['offset'] = vector[0]
+                axis['scale'] = vector[1] - vector[0]
+                if len(vector) > 2 and not np.allclose(np.diff(vector), axis['scale']):
+                    assert len(vector) == size, 'Axis vector does not match the data!'
+                    axis['values'] = vector
+            except (IndexError, TypeError, ValueError, AssertionError) as e:
+                cls._log.warning('Could not calculate scale/offset of axis {}: {}'.format(i, e))
+            axes.append(axis)
+        return axes
 
     def add_signal(self, name, signal, metadata={}):
         '''Add a hyperspy signal to the EMD instance and make sure all metadata is present.
@@ -153,6 +200,11 @@ class EMD(object):
 
         '''
         self._log.debug('Calling add_signal')
+        if isinstance(signal, RawSignal):  # global metadata is not copied!
+            signal.name = name
+            signal.metadata.update(metadata)
+            self.data[name] = signal
+            return
         # TODO: Make this ULTRAFLEXIBLE, able to handle unf, dm3, images, txt, all that jazz!
         # TODO: OR have separate add_signal_from_file for that! (which envokes this! jup, better!)
         import hyperspy.api as hp
@@ -181,7 +233,8 @@ class EMD(object):
         # Add signal:
         self.data[name] = signal
 
-    def save_to_emd(self, filename='datacollection.emd'):
+    def save_to_emd(self, filename='datacollection.emd', chunks='auto', compression=None,
+                    compression_opts=None, shuffle=False, dtype=None, mode='w'):
         '''Save :class:`~.EMD` data in a file with emd(hdf5)-format.
 
         Parameters
@@ -189,62 +242,124 @@ class EMD(object):
         filename : string, optional
             The name of the emd-file in which to store the data.
             The default is 'datacollection.emd'.
+        chunks : {'auto', True, None} or tuple, optional
+            Chunk shape of the datasets. The default 'auto' uses frame- or spectrum-aligned
+            chunks of about 1 MiB (see Notes), True lets h5py guess a chunk shape and None writes
+            contiguous datasets (not possible with compression). A tuple is used for all signals.
+        compression : {None, 'gzip', 'lzf'}, optional
+            Compression filter of the datasets. 'lzf' is fast, 'gzip' compresses better and can
+            be read everywhere. The default is None (uncompressed).
+        compression_opts : int, optional
+            Compression level for 'gzip' (0-9, default 4).
+        shuffle : boolean, optional
+            If True, the byte shuffle filter is applied before the compression, which often
+            improves the compression ratio of noisy numeric data considerably. Default is False.
+        dtype : :class:`~numpy.dtype`, optional
+            If given, the data is converted to this type before writing (e.g. 'float32' to
+            halve the size of float64 reconstructions). Precision beyond the type is lost!
+        mode : {'w', 'a'}, optional
+            With 'w' (default) the file is created from scratch. With 'a' an existing file is
+            updated: the metadata attributes are updated, signal groups with the same name are
+            replaced and all other signals in the file are left untouched.
 
         Returns
         -------
         None
 
+        Notes
+        -----
+        The 'auto' chunks hold complete frames (images) or spectra, so reading single frames or
+        spectra only touches the corresponding chunks. Small frames and spectra are grouped
+        along the innermost navigation axes, frames larger than 1 MiB are split along their
+        largest axes.
+
+        In mode 'a' the space of replaced signals is not freed by HDF5, use `h5repack` to
+        shrink files after many replacements.
+
         '''
         self._log.debug('Calling save_to_emd')
+        assert mode in ['w', 'a'], "Mode has to be 'w' or 'a'!"
         # Open file:
-        emd_file = h5py.File(filename, 'w')
-        # Write version:
-        ver_maj, ver_min = config.EMD_VERSION.split('.')
-        emd_file.attrs['version_major'] = ver_maj
-        emd_file.attrs['version_minor'] = ver_min
-        # Write user:
-        user_group = emd_file.create_group('user')
-        for key, value in self.user.iteritems():
-            user_group.attrs[key] = value
-        # Write microscope:
-        microscope_group = emd_file.create_group('microscope')
-        for key, value in self.microscope.iteritems():
-            microscope_group.attrs[key] = value
-        # Write sample:
-        sample_group = emd_file.create_group('sample')
-        for key, value in self.sample.iteritems():
-            sample_group.attrs[key] = value
-        # Write comments:
-        comments_group = emd_file.create_group('comments')
-        for key, value in self.comments.iteritems():
-            comments_group.attrs[key] = value
+        emd_file = h5py.File(filename, mode)
+        # Write version and global metadata:
+        self._write_metadata(emd_file)
         # Write data:
-        data_group = emd_file.create_group('data')
-        for signal in self.data.values():
-            self._write_signal_to_group(data_group, signal)
+        data_group = emd_file.require_group('data')
+        for name, signal in self.data.iteritems():
+            if name in data_group:  # replace existing signal!
+                del data_group[name]
+            self._write_signal_to_group(data_group, signal, chunks=chunks,
+                                        compression=compression,
+                                        compression_opts=compression_opts, shuffle=shuffle,
+                                        dtype=dtype)
         # Close file and return EMD object:
         emd_file.close()
 
+    def save_metadata_to_emd(self, filename):
+        '''Update only the global metadata (`user`, `microscope`, `sample`, `comments`) of an
+        existing emd-file, no data is touched.
+
+        Parameters
+        ----------
+        filename : string
+            The name of the emd-file.
+
+        Returns
+        -------
+        None
+
+        '''
+        self._log.debug('Calling save_metadata_to_emd')
+        with h5py.File(filename, 'a') as emd_file:
+            self._write_metadata(emd_file)
+
+    def _write_metadata(self, emd_file):
+        self._log.debug('Calling _write_metadata')
+        # Write version:
+        _write_version(emd_file)
+        # Write user, microscope, sample and comments (existing attributes are updated):
+        for group_name in ['user', 'microscope', 'sample', 'comments']:
+            group = emd_file.require_group(group_name)
+            for key, value in getattr(self, group_name).iteritems():
+                group.attrs[key] = value
+
     @classmethod
-    def load_from_emd(cls, filename):
+    def load_from_emd(cls, filename, lazy=False, raw=False):
         '''Construct :class:`~.EMD` object from an emd-file.
 
         Parameters
         ----------
         filename : string
             The name of the emd-file from which to load the data. Standard format is '*.emd'.
+        lazy : boolean, optional
+            If True, the file is kept open and only the global metadata is read. The `data`
+            dictionary holds proxies which are replaced by the signals when they are accessed
+            for the first time (only the accessed dataset is read). The file is closed with
+            :func:`~.close` or by using the :class:`~.EMD` object as a context manager.
+            The default is False (all signals are loaded and the file is closed).
+        raw : boolean, optional
+            If True, the signals are loaded as :class:`~.RawSignal` instances (numpy arrays with
+            axes calibration and metadata), hyperspy is neither imported nor are signals built
+            until :func:`~.RawSignal.to_signal` is called. The global metadata is only stored in
+            the :class:`~.EMD` instance. The default is False.
 
         Returns
         -------
         emd: :class:`~.EMD`
             A :class:`~.EMD` object containing the loaded data.
 
+        Examples
+        --------
+        >>> with EMD.load_from_emd('collection.emd', lazy=True) as emd:
+        ...     phase = emd.data['phase']  # only this signal is read!
+
         '''
         cls._log.debug('Calling load_from_ems')
         # Read in file:
         emd_file = h5py.File(filename, 'r')
-        # Creat empty EMD instance:
-        emd = EMD()
+        # Creat empty EMD instance (new dictionaries, the defaults must not be filled!):
+        emd = EMD(data={}, user={}, microscope={}, sample={}, comments={})
+        emd._raw = raw
         # Extract user:
         user_group = emd_file.get('user')
         if user_group is not None:
@@ -266,17 +381,227 @@ class EMD(object):
             for key, value in comments_group.attrs.iteritems():
                 emd.comments[key] = value
         # Extract data:
+        if lazy:
+            emd.data = _LazySignalDict(emd)
         data_group = emd_file.get('data')
         if data_group is not None:
             for name, group in data_group.iteritems():
                 if isinstance(group, h5py.Group):
                     if group.attrs.get('emd_group_type') == 1:
-                        emd._read_signal_from_group(name, group)
-        # Close file and return EMD object:
-        emd_file.close()
+                        if lazy:
+                            emd.data.add_proxy(name, group)
+                        else:
+                            emd._read_signal_from_group(name, group)
+        # Close file (if not lazy) and return EMD object:
+        if lazy:
+            emd._emd_file = emd_file
+        else:
+            emd_file.close()
         return emd
 
-    # TODO: def export_signal(signal_name, filename):  # Wrappers for several formats!
+    def close(self):
+        '''Close the emd-file of a lazily loaded :class:`~.EMD` instance.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+
+        Notes
+        -----
+        Signals which were not accessed before can not be loaded afterwards.
+
+        '''
+        self._log.debug('Calling close')
+        if self._emd_file is not None:
+            self._emd_file.close()
+            self._emd_file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @classmethod
+    def load_slice(cls, filename, name, roi, raw=False):
+        '''Load only a part (hyperslab) of a signal from an emd-file.
+
+        Parameters
+        ----------
+        filename : string
+            The name of the emd-file.
+        name : string
+            The name of the signal in the `data` group.
+        roi : tuple of int, slice or Ellipsis
+            Region of interest with numpy indexing semantics (one entry per axis, missing axes
+            are taken completely), e.g. ``(5,)`` for the 6th frame of a stack or
+            ``(slice(10, 20), slice(10, 20))`` for a spatial region of a spectrum image. Steps
+            have to be positive, integer indices remove their axis.
+        raw : boolean, optional
+            If True, a :class:`~.RawSignal` is returned instead of a hyperspy signal.
+
+        Returns
+        -------
+        signal : :class:`~hyperspy.signal.Signal` or :class:`~.RawSignal`
+            The signal holding only the selected part. The offsets and scales of the axes are
+            adjusted to the slice, so physical coordinates are preserved.
+
+        Notes
+        -----
+        Only the selected region is read from the file (h5py selection). With chunked datasets
+        (see :func:`~.save_to_emd`) only the touched chunks are read.
+
+        '''
+        cls._log.debug('Calling load_slice')
+        with h5py.File(filename, 'r') as emd_file:
+            data, axes, metadata = cls._read_group(emd_file['data'][name], roi)
+        if raw:
+            return RawSignal(name, data, axes, metadata)
+        signal = cls._create_signal(data, axes, metadata)
+        signal.metadata.General.title = name
+        return signal
+
+    @classmethod
+    def read_calibration(cls, filename, name):
+        '''Read the axes calibration of a signal in an emd-file without touching its data.
+
+        Parameters
+        ----------
+        filename : string
+            The name of the emd-file.
+        name : string
+            The name of the signal in the `data` group.
+
+        Returns
+        -------
+        axes : list of dictionaries
+            Calibration of every axis (keys `name`, `units`, `offset`, `scale` and `size`).
+            Non-uniform axes (stored as explicit axis vectors) also hold the vector as `values`.
+
+        '''
+        cls._log.debug('Calling read_calibration')
+        with h5py.File(filename, 'r') as emd_file:
+            return cls._read_axes(emd_file['data'][name])
+
+    @staticmethod
+    def roi_from_values(axes, *values):
+        '''Convert physical coordinates to a roi (pixel indices and slices).
+
+        Parameters
+        ----------
+        axes : list of dictionaries
+            The axes calibration, e.g. from :func:`~.read_calibration`.
+        *values : float, tuple of two floats or None
+            One entry per axis (missing axes are taken completely): a single value selects the
+            closest pixel (and removes the axis), a (start, stop) tuple the range of pixels
+            between the closest pixels to both values (inclusive), None the complete axis.
+
+        Returns
+        -------
+        roi : tuple
+            The roi which can be used with :func:`~.load_slice`.
+
+        Notes
+        -----
+        Uniform axes are resolved in constant time, non-uniform axes by a binary search.
+
+        Examples
+        --------
+        >>> axes = EMD.read_calibration('map.emd', 'eels')
+        >>> roi = EMD.roi_from_values(axes, (10., 20.), (10., 20.), (400., 600.))
+        >>> signal = EMD.load_slice('map.emd', 'eels', roi)
+
+        '''
+        assert len(values) <= len(axes), 'Too many values for the axes!'
+        roi = []
+        for axis, value in zip(axes, values):
+            if value is None:
+                roi.append(slice(None))
+            elif isinstance(value, tuple):
+                start, stop = sorted(_value_to_index(axis, v) for v in value)
+                roi.append(slice(start, stop+1))
+            else:
+                roi.append(_value_to_index(axis, value))
+        return tuple(roi)
+
+    @classmethod
+    def read_header(cls, filename):
+        '''Read the global metadata and signal descriptions of an emd-file without any data.
+
+        Parameters
+        ----------
+        filename : string
+            The name of the emd-file.
+
+        Returns
+        -------
+        header : dict
+            Dictionary with the global metadata (`user`, `microscope`, `sample`, `comments`) and
+            the `signals` dictionary, which holds the `shape`, `dtype`, `axes` (name, units,
+            scale and offset of each dimension) and the `metadata` attributes of every signal.
+
+        '''
+        cls._log.debug('Calling read_header')
+        header = {}
+        with h5py.File(filename, 'r') as emd_file:
+            for key in ['user', 'microscope', 'sample', 'comments']:
+                group = emd_file.get(key)
+                header[key] = dict(group.attrs) if group is not None else {}
+            signals = {}
+            data_group = emd_file.get('data')
+            if data_group is not None:
+                for name, group in data_group.iteritems():
+                    if isinstance(group, h5py.Group):
+                        if group.attrs.get('emd_group_type') == 1:
+                            dataset = group['data']
+                            signals[name] = {'shape': dataset.shape,
+                                             'dtype': dataset.dtype.name,
+                                             'axes': cls._read_axes(group),
+                                             'metadata': dict(group.attrs)}
+            header['signals'] = signals
+        return header
+
+    def export_signal(self, name, filename):
+        '''Export a signal of the EMD instance to another file format.
+
+        Parameters
+        ----------
+        name : string
+            The name of the signal (key of the `data` dictionary).
+        filename : string
+            The name of the file. The format is chosen by the extension: `.unf`-files are written
+            with :class:`~.SemperFormat` (up to 3 dimensions), all other extensions are passed
+            to the hyperspy writers (e.g. '.hdf5', '.tif', '.rpl'). A :class:`~.RawSignal` is
+            written to `.unf`-files directly and only converted to a hyperspy signal (see
+            :func:`~.RawSignal.to_signal`) for the other formats.
+
+        Returns
+        -------
+        None
+
+        Notes
+        -----
+        Whole directories can be converted with :func:`~ercpy.formats.convert.convert_directory`.
+
+        '''
+        self._log.debug('Calling export_signal')
+        signal = self.data[name]
+        if os.path.splitext(filename)[1].lower() == '.unf':
+            if isinstance(signal, RawSignal):  # no hyperspy needed:
+                from .convert import _arrays_to_unf
+                _arrays_to_unf(name, signal.data, signal.axes, signal.metadata,
+                               os.path.abspath(filename))
+            else:
+                from .semper import SemperFormat
+                SemperFormat.from_signal(signal).to_file(os.path.abspath(filename))
+        else:
+            if isinstance(signal, RawSignal):
+                signal = signal.to_signal()
+            signal.save(filename, overwrite=True)
 
     def print_info(self):
         '''Print all relevant information about the EMD instance.
@@ -306,9 +631,336 @@ class EMD(object):
         print '--------------------\n\nData:\n--------------------'
         for key, value in self.data.iteritems():
             print '{}:'.format(key).ljust(15), value
-            print value.metadata.Signal
+            print value.metadata if isinstance(value, RawSignal) else value.metadata.Signal
         print '--------------------\n'
 
+
+def _normalize_roi(roi, shape):
+    # Convert a roi to a tuple with one positive integer or slice (positive step) per axis:
+    if not isinstance(roi, tuple):
+        roi = (roi,)
+    if Ellipsis in roi:
+        i = roi.index(Ellipsis)
+        roi = roi[:i] + (slice(None),)*(len(shape)-len(roi)+1) + roi[i+1:]
+    assert len(roi) <= len(shape), 'Too many indices for the dataset!'
+    roi = roi + (slice(None),)*(len(shape)-len(roi))
+    normalized = []
+    for index, size in zip(roi, shape):
+        if isinstance(index, slice):
+            index = slice(*index.indices(size))
+            assert index.step > 0, 'Only positive steps are supported!'
+        elif isinstance(index, (int, long, np.integer)):
+            if not -size <= index < size:
+                raise IndexError('Index {} is out of bounds for an axis of size {}!'.format(
+                    index, size))
+            index = int(index) % size
+        else:
+            raise TypeError('Only integers, slices and Ellipsis are supported in a roi!')
+        normalized.append(index)
+    return tuple(normalized)
+
+
+def _slice_axis(axis, index):
+    # Adjust the calibration of an axis to a (normalized) slice:
+    axis = dict(axis)
+    if axis.get('values') is not None:  # non-uniform axis:
+        axis['values'] = axis['values'][index]
+        axis['offset'] = axis['values'][0]
+        axis['scale'] = axis['values'][1] - axis['values'][0] if len(axis['values']) > 1 else 1.
+    else:
+        scale = axis.get('scale', 1.)
+        axis['offset'] = axis.get('offset', 0.) + index.start*scale
+        axis['scale'] = scale * index.step
+    axis['size'] = len(xrange(index.start, index.stop, index.step))
+    return axis
+
+
+def _value_to_index(axis, value):
+    # Index of the pixel closest to a physical value (constant time for uniform axes, binary
+    # search for non-uniform ones), clipped to the axis:
+    if axis.get('values') is not None:
+        values = np.asarray(axis['values'])
+        ascending = values[-1] >= values[0]
+        if not ascending:
+            values = values[::-1]
+        i = int(np.clip(np.searchsorted(values, value), 1, len(values)-1))
+        index = i if abs(values[i]-value) < abs(values[i-1]-value) else i-1
+        return index if ascending else len(values)-1-index
+    index = int(round((value - axis.get('offset', 0.)) / axis.get('scale', 1.)))
+    if axis.get('size') is not None:
+        index = min(max(index, 0), axis['size']-1)
+    return index
+
+
+def _default_chunks(shape, signal_ndim, itemsize, target_size=2**20):
+    # Frame- or spectrum-aligned chunk shape with a size of about target_size bytes:
+    nav_ndim = len(shape) - signal_ndim
+    chunks = [1]*nav_ndim + [max(size, 1) for size in shape[nav_ndim:]]
+    # Frames which are larger than the target are split along their largest axes:
+    while np.prod(chunks)*itemsize > target_size and max(chunks[nav_ndim:]) > 1:
+        i = nav_ndim + int(np.argmax(chunks[nav_ndim:]))
+        chunks[i] = (chunks[i]+1) // 2
+    # Small frames or spectra are grouped along the navigation axes (innermost first):
+    for i in reversed(range(nav_ndim)):
+        factor = target_size // (np.prod(chunks)*itemsize)
+        if factor < 2:
+            break
+        chunks[i] = int(max(min(shape[i], factor), 1))
+    return tuple(int(c) for c in chunks)
+
+
+def _write_dataset(group, name, data, signal_ndim, chunks='auto', compression=None,
+                   compression_opts=None, shuffle=False, dtype=None):
+    # Write data as a (chunked and compressed) dataset, see EMD.save_to_emd for the options:
+    data = np.asarray(data)
+    if dtype is not None:
+        data = data.astype(dtype, copy=False)
+    if data.ndim == 0:  # scalars can not be chunked!
+        return group.create_dataset(name, data=data)
+    if chunks == 'auto':
+        chunks = _default_chunks(data.shape, signal_ndim, data.dtype.itemsize)
+    return group.create_dataset(name, data=data, chunks=chunks, compression=compression,
+                                compression_opts=compression_opts, shuffle=shuffle)
+
+
+class RawSignal(object):
+
+    '''Class for a lightweight signal without hyperspy (numpy array plus calibration).
+
+    :class:`~.RawSignal` instances are returned by the raw access modes of :class:`~.EMD`
+    (:func:`~.EMD.load_from_emd` and :func:`~.EMD.load_slice` with `raw=True`) and can be saved
+    like hyperspy signals. Hyperspy signals are only built by :func:`~.to_signal`.
+
+    Attributes
+    ----------
+    name: string
+        The name of the signal.
+    data: :class:`~numpy.ndarray`
+        The data of the signal.
+    axes: list of dictionaries
+        Calibration of every axis of `data` (keys `name`, `units`, `offset`, `scale` and `size`,
+        non-uniform axes also hold the axis vector as `values`).
+    metadata: dictionary
+        Signal specific metadata (the attributes of the signal group).
+
+    '''
+
+    def __init__(self, name, data, axes=None, metadata=None):
+        self.name = name
+        self.data = data
+        if axes is None:  # Default calibration: pixel coordinates without units!
+            axes = [{'name': '', 'units': '', 'offset': 0., 'scale': 1., 'size': size}
+                    for size in data.shape]
+        assert len(axes) == len(data.shape), 'One axis per dimension is needed!'
+        self.axes = axes
+        self.metadata = {} if metadata is None else metadata
+
+    def __repr__(self):
+        return 'RawSignal(name={!r}, shape={}, dtype={})'.format(self.name, self.data.shape,
+                                                                 self.data.dtype)
+
+    @property
+    def signal_ndim(self):
+        '''Number of signal dimensions (last axes) derived from the `record_by` metadata.'''
+        record_by = self.metadata.get('record_by', '')
+        ndim = {'spectrum': 1, 'image': 2}.get(record_by, 2)
+        return min(ndim, len(self.data.shape))
+
+    def to_signal(self):
+        '''Build a hyperspy signal with the calibration and metadata of the raw signal.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        signal : :class:`~hyperspy.signal.Signal`
+            The corresponding hyperspy signal.
+
+        '''
+        signal = EMD._create_signal(self.data, self.axes, self.metadata)
+        signal.metadata.General.title = self.name
+        signal.metadata.Signal.add_dictionary(self.metadata)
+        return signal
+
+
+class EMDStreamWriter(object):
+
+    '''Class for appending frames to a signal in an emd-file as they are produced.
+
+    The signal is stored in a resizable dataset, which grows along its first axis with every
+    call of :func:`~.append`, so series (e.g. reconstructed frames of a time series) can be
+    written without holding them in memory or rewriting the file. Other signals and metadata in
+    an existing file are not touched, an existing signal with the same name is replaced. The
+    writer should be used as a context manager (or closed with :func:`~.close`).
+
+    Attributes
+    ----------
+    filename: string
+        The name of the emd-file (created if it does not exist).
+    name: string
+        The name of the signal in the `data` group.
+    frame_shape: tuple
+        The shape of a single frame.
+
+    Examples
+    --------
+    >>> with EMDStreamWriter('series.emd', 'phase', (512, 512), 'float32') as writer:
+    ...     for hologram in holograms:
+    ...         writer.append(reconstruct(hologram))
+
+    '''
+
+    _log = logging.getLogger(__name__)
+
+    def __init__(self, filename, name, frame_shape, dtype='float32', axes=None, metadata={},
+                 chunks='auto', compression=None, compression_opts=None, shuffle=False):
+        self._log.debug('Calling __init__')
+        self.filename = filename
+        self.name = name
+        self.frame_shape = tuple(frame_shape)
+        self._emd_file = h5py.File(filename, 'a')
+        if 'version_major' not in self._emd_file.attrs:  # new file!
+            _write_version(self._emd_file)
+        data_group = self._emd_file.require_group('data')
+        if name in data_group:  # replace existing signal!
+            del data_group[name]
+        group = data_group.create_group(name)
+        if chunks == 'auto':  # one frame per chunk, so every append fills complete chunks:
+            chunks = _default_chunks((1,)+self.frame_shape, len(self.frame_shape),
+                                     np.dtype(dtype).itemsize)
+        self.dataset = group.create_dataset('data', shape=(0,)+self.frame_shape, dtype=dtype,
+                                            maxshape=(None,)+self.frame_shape, chunks=chunks,
+                                            compression=compression,
+                                            compression_opts=compression_opts, shuffle=shuffle)
+        if axes is None:  # Default calibration: pixel coordinates without units!
+            axes = [{'name': '', 'units': None, 'offset': 0., 'scale': 1.}
+                    for _ in range(len(self.frame_shape)+1)]
+        _write_axes(group, axes)
+        group.attrs['emd_group_type'] = 1
+        for key, value in metadata.iteritems():
+            group.attrs[key] = value
+        self._log.debug('Created '+str(self))
+
+    def __repr__(self):
+        return 'EMDStreamWriter(filename={!r}, name={!r}, frame_shape={})'.format(
+            self.filename, self.name, self.frame_shape)
+
+    def __len__(self):
+        return self.dataset.shape[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def append(self, frames, flush=False):
+        '''Append one frame or a stack of frames to the signal.
+
+        Parameters
+        ----------
+        frames : :class:`~numpy.ndarray`
+            A single frame with `frame_shape` or a stack of frames (stacked along the first
+            axis). The data is converted to the dtype of the dataset.
+        flush : boolean, optional
+            If True, the file is flushed after writing, so other processes can read the frames
+            immediately. Default is False.
+
+        Returns
+        -------
+        None
+
+        '''
+        frames = np.asarray(frames)
+        if frames.shape == self.frame_shape:
+            frames = frames[np.newaxis, ...]
+        assert frames.shape[1:] == self.frame_shape, 'Frame shape does not match the signal!'
+        n_frames = self.dataset.shape[0]
+        self.dataset.resize(n_frames+frames.shape[0], axis=0)
+        self.dataset[n_frames:] = frames
+        if flush:
+            self._emd_file.flush()
+
+    def close(self):
+        '''Close the emd-file.'''
+        self._log.debug('Calling close')
+        if self._emd_file is not None:
+            self._emd_file.close()
+            self._emd_file = None
+
+
+def _write_version(emd_file):
+    ver_maj, ver_min = config.EMD_VERSION.split('.')
+    emd_file.attrs['version_major'] = ver_maj
+    emd_file.attrs['version_minor'] = ver_min
+
+
+def _write_axes(group, axes):
+    # Write the calibration of all axes (dicts with name, units, offset and scale) as the dim
+    # datasets of a signal group. Uniform axes are stored compact as [offset, offset+scale],
+    # non-uniform axes (with 'values') as the explicit axis vector:
+    for i, axis in enumerate(axes):
+        if axis.get('values') is not None:
+            vector = np.asarray(axis['values'])
+        else:
+            offset, scale = axis.get('offset', 0.), axis.get('scale', 1.)
+            vector = [offset, offset+scale]
+        dim = group.create_dataset('dim{}'.format(i+1), data=vector)
+        dim.attrs['name'] = axis.get('name') or ''
+        units = axis.get('units')
+        if units is None:
+            units = ''
+        else:
+            units = '[{}]'.format('_'.join(list(units)))
+        dim.attrs['units'] = units
+        # TODO: What if units is not one or two characters long? More _? E.g. keV?
+
+
+class _LazySignalDict(dict):
+
+    # Dictionary for lazily loaded EMD instances, which holds the h5py groups of the signals
+    # as proxies. Signals are read (and replace their proxies) when they are accessed by key or
+    # while iterating over values and items:
+
+    def __init__(self, emd):
+        super(_LazySignalDict, self).__init__()
+        self._emd = emd
+
+    def add_proxy(self, name, group):
+        dict.__setitem__(self, name, group)
+
+    def is_loaded(self, name):
+        return not isinstance(dict.__getitem__(self, name), h5py.Group)
+
+    def __getitem__(self, name):
+        value = dict.__getitem__(self, name)
+        if isinstance(value, h5py.Group):
+            if not value:  # invalid group identifier!
+                raise IOError('The emd-file was closed before signal {} was loaded!'.format(name))
+            self._emd._read_signal_from_group(name, value)  # replaces the proxy (add_signal)!
+            value = dict.__getitem__(self, name)
+        return value
+
+    def get(self, name, default=None):
+        return self[name] if name in self else default
+
+    def itervalues(self):
+        for name in self:
+            yield self[name]
+
+    def iteritems(self):
+        for name in self:
+            yield name, self[name]
+
+    def values(self):
+        return list(self.itervalues())
+
+    def items(self):
+        return list(self.iteritems())
+
+
 # TODO: function to generate subsets of datasets! List as input!
 
 if __name__ == '__main__':
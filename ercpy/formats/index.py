@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+# Copyright 2015 by Forschungszentrum Juelich GmbH
+#
+"""This module provides the :class:`~.FileIndex` class for a header-only index of file archives."""
+
+
+import os
+import json
+import sqlite3
+
+from .emd import EMD
+from .semper import SemperFormat
+
+import logging
+
+
+__all__ = ['FileIndex']
+
+
+class FileIndex(object):
+
+    '''Class for a searchable, header-only index of Semper and EMD files.
+
+    The :class:`~.FileIndex` scans directory trees for `.unf`- and `.emd`-files and only reads
+    their headers (:func:`~.SemperFormat.read_header` and :func:`~.EMD.read_header`), no pixel
+    data is touched. Shapes, dtypes, calibrations, titles, dates and the global user, microscope
+    and sample metadata are stored in a SQLite database (one row per dataset, emd-files can hold
+    several), which can be queried instantly. Re-scans only read files whose modification time
+    changed and remove files which no longer exist. Files without datasets (broken files or
+    emd-files without signals) are recorded separately with their modification time, so they
+    are not read again until they change.
+
+    Attributes
+    ----------
+    filename: string
+        The name of the SQLite database file (':memory:' for a temporary index).
+
+    '''
+
+    _log = logging.getLogger(__name__)
+
+    EXTENSIONS = {'.unf': 'semper', '.emd': 'emd'}
+
+    COLUMNS = ['path', 'name', 'format', 'mtime', 'title', 'shape', 'dtype', 'scales',
+               'offsets', 'units', 'date', 'user', 'microscope', 'sample']
+
+    def __init__(self, filename='ercpy_index.sqlite'):
+        self._log.debug('Calling __init__')
+        self.filename = filename
+        self._connection = sqlite3.connect(filename)
+        self._connection.execute('CREATE TABLE IF NOT EXISTS datasets (path TEXT, name TEXT, '
+                                 'format TEXT, mtime REAL, title TEXT, shape TEXT, dtype TEXT, '
+                                 'scales TEXT, offsets TEXT, units TEXT, date TEXT, user TEXT, '
+                                 'microscope TEXT, sample TEXT)')
+        self._connection.execute('CREATE INDEX IF NOT EXISTS path_index ON datasets (path)')
+        self._connection.execute('CREATE TABLE IF NOT EXISTS unindexed (path TEXT PRIMARY KEY, '
+                                 'mtime REAL, reason TEXT)')
+        self._connection.commit()
+        self._log.debug('Created '+str(self))
+
+    def __repr__(self):
+        return 'FileIndex(filename={!r})'.format(self.filename)
+
+    def __len__(self):
+        return self._connection.execute('SELECT COUNT(*) FROM datasets').fetchone()[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        '''Close the connection to the database.'''
+        self._log.debug('Calling close')
+        self._connection.close()
+
+    def scan(self, directory, rescan=False):
+        '''Add all Semper and EMD files in a directory tree to the index.
+
+        Parameters
+        ----------
+        directory : string
+            The root of the directory tree which is scanned.
+        rescan : boolean, optional
+            If True, all files are read again, otherwise (default) only new files and files
+            whose modification time changed since the last scan are read.
+
+        Returns
+        -------
+        n_updated, n_removed : int
+            Number of (re-)indexed files and number of removed files which no longer exist.
+
+        '''
+        self._log.debug('Calling scan')
+        directory = os.path.abspath(directory)
+        mtimes = dict(self._connection.execute('SELECT DISTINCT path, mtime FROM datasets'))
+        mtimes.update(self._connection.execute('SELECT path, mtime FROM unindexed'))
+        found, n_updated = set(), 0
+        for root, _, filenames in os.walk(directory):
+            for filename in filenames:
+                file_format = self.EXTENSIONS.get(os.path.splitext(filename)[1].lower())
+                if file_format is None:
+                    continue
+                path = os.path.join(root, filename)
+                found.add(path)
+                mtime = os.path.getmtime(path)
+                if not rescan and mtimes.get(path) == mtime:
+                    continue  # unchanged since last scan!
+                try:
+                    rows, reason = self._read_rows(path, file_format, mtime), 'no datasets'
+                except Exception as e:  # broken files should not stop the scan!
+                    self._log.warning('Could not index {} ({})!'.format(path, e))
+                    rows, reason = [], str(e)
+                else:
+                    n_updated += 1
+                # Replace the old entries (also the stale ones of files which became broken):
+                self._delete(path)
+                if rows:
+                    self._connection.executemany('INSERT INTO datasets VALUES ({})'.format(
+                        ', '.join('?'*len(self.COLUMNS))), rows)
+                else:
+                    self._connection.execute('INSERT INTO unindexed VALUES (?, ?, ?)',
+                                             (path, mtime, reason))
+        # Remove files in the scanned tree which no longer exist:
+        removed = [path for path in mtimes
+                   if path.startswith(directory + os.sep) and path not in found]
+        for path in removed:
+            self._delete(path)
+        self._connection.commit()
+        self._log.info('Indexed {} files, removed {} files'.format(n_updated, len(removed)))
+        return n_updated, len(removed)
+
+    def _delete(self, path):
+        # Remove all entries of a file (the changes are committed by the caller):
+        self._connection.execute('DELETE FROM datasets WHERE path = ?', (path,))
+        self._connection.execute('DELETE FROM unindexed WHERE path = ?', (path,))
+
+    def _read_rows(self, path, file_format, mtime):
+        # Read the header of a file and return one row per dataset:
+        if file_format == 'semper':
+            header = SemperFormat.read_header(path)
+            dtype = SemperFormat.IFORM_DICT[header['IFORM']]
+            title = header['title'].decode('latin-1')  # raw bytes from the file!
+            return [(path, None, file_format, mtime, title, _dumps(header['shape']),
+                     dtype.__name__, _dumps(header['scales']), _dumps(header['offsets']),
+                     _dumps(header['units']), header['date'], None, None, None)]
+        header = EMD.read_header(path)
+        rows = []
+        for name, signal in sorted(header['signals'].iteritems()):
+            axes = signal['axes']
+            rows.append((path, name, file_format, mtime, signal['metadata'].get('title', name),
+                         _dumps(signal['shape']), signal['dtype'],
+                         _dumps([axis.get('scale', 1.) for axis in axes]),
+                         _dumps([axis.get('offset', 0.) for axis in axes]),
+                         _dumps([axis['units'] for axis in axes]),
+                         signal['metadata'].get('date'), _dumps(header['user']),
+                         _dumps(header['microscope']), _dumps(header['sample'])))
+        return rows
+
+    def query(self, title=None, file_format=None, dtype=None, shape=None, microscope=None,
+              sample=None, where=None, params=()):
+        '''Find indexed files by their header information.
+
+        Parameters
+        ----------
+        title : string, optional
+            Pattern for the title (SQL `LIKE`, `%` matches any string, `_` any character).
+        file_format : {'semper', 'emd'}, optional
+            Only return files of this format.
+        dtype : string, optional
+            Data type name of the datasets (e.g. 'float32').
+        shape : tuple, optional
+            Shape of the datasets.
+        microscope, sample : string, optional
+            Substring which has to be present in the microscope or sample metadata.
+        where : string, optional
+            Additional SQL condition on the columns listed in `COLUMNS` (with `?` placeholders
+            for the `params`), e.g. "date LIKE '2015-%'".
+        params : tuple, optional
+            Parameters which are inserted for the placeholders in `where`.
+
+        Returns
+        -------
+        paths : list of strings
+            Sorted paths of all files with at least one matching dataset.
+
+        '''
+        self._log.debug('Calling query')
+        conditions, values = [], []
+        for column, operator, value in [('title', 'LIKE', title),
+                                        ('format', '=', file_format),
+                                        ('dtype', '=', dtype),
+                                        ('shape', '=', None if shape is None else _dumps(shape)),
+                                        ('microscope', 'LIKE',
+                                         None if microscope is None else '%'+microscope+'%'),
+                                        ('sample', 'LIKE',
+                                         None if sample is None else '%'+sample+'%')]:
+            if value is not None:
+                conditions.append('{} {} ?'.format(column, operator))
+                values.append(value)
+        if where is not None:
+            conditions.append('({})'.format(where))
+            values.extend(params)
+        sql = 'SELECT DISTINCT path FROM datasets'
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        return [row[0] for row in self._connection.execute(sql + ' ORDER BY path', values)]
+
+    def entries(self, path):
+        '''Return the indexed header information of all datasets of a file as dictionaries.'''
+        self._log.debug('Calling entries')
+        cursor = self._connection.execute('SELECT * FROM datasets WHERE path = ?', (path,))
+        entries = []
+        for row in cursor:
+            entry = dict(zip(self.COLUMNS, row))
+            for key in ['shape', 'scales', 'offsets', 'units', 'user', 'microscope', 'sample']:
+                if entry[key] is not None:
+                    entry[key] = json.loads(entry[key])
+            entries.append(entry)
+        return entries
+
+
+def _dumps(obj):
+    # JSON representation of header values (numpy types are converted to python types):
+    return json.dumps(obj, sort_keys=True,
+                      default=lambda o: o.tolist() if hasattr(o, 'tolist') else str(o))
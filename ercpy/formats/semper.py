@@ -7,7 +7,9 @@ files which are used in Semper."""
 
 
 import os
+import glob
 from time import strftime
+from multiprocessing.pool import ThreadPool
 import numpy as np
 import struct
 
@@ -74,6 +76,20 @@ class SemperFormat(object):
 
     IFORM_DICT_INV = {v: k for k, v in IFORM_DICT.iteritems()}
 
+    # The label record holds 256 bytes (each stored in a 2 byte integer), big-endian integers and
+    # little-endian floats are spread over consecutive bytes (first byte: index 0):
+    LABEL_DTYPE = np.dtype({'names': ['ident', 'ncol', 'nrow', 'nlay', 'iccoln', 'icrown',
+                                      'iclayn', 'iclass', 'iform', 'iwp', 'date', 'ncrang',
+                                      'range', 'ipltyp', 'real_coords', 'dz', 'z0', 'dy', 'y0',
+                                      'dx', 'x0', 'title', 'ux', 'uy', 'uz'],
+                            'formats': ['S6', '>i2', '>i2', '>i2', '>i2', '>i2', '>i2', 'u1',
+                                        'u1', 'u1', ('u1', 6), 'u1', 'S27', 'u1', 'u1', '<f4',
+                                        '<f4', '<f4', '<f4', '<f4', '<f4', 'S144', 'S4', 'S4',
+                                        'S4'],
+                            'offsets': [0, 6, 8, 10, 12, 14, 16, 18, 19, 20, 21, 27, 28, 55, 62,
+                                        75, 79, 83, 87, 91, 95, 100, 244, 248, 252],
+                            'itemsize': 256})
+
     def __init__(self, arg_dict):
         self._log.debug('Calling __init__')
         self.data = arg_dict['data']
@@ -95,19 +111,33 @@ class SemperFormat(object):
         self._log.debug('Created '+str(self))
 
     @classmethod
-    def from_file(self, filename):
+    def from_file(self, filename, lazy=False, validate=True):
         '''Load a `.unf`-file into a :class:`~.SemperFormat` object.
 
         Parameters
         ----------
         filename : string
             The name of the unf-file from which to load the data. Standard format is '\*.unf'.
+        lazy : boolean, optional
+            If True, the picture data is returned as a read-only strided view into a memory map
+            of the file, which is only read from disk when it is accessed. If False (default),
+            a contiguous copy is loaded into memory.
+        validate : boolean, optional
+            Determines if the record length markers around the picture rows are checked. Default
+            is True. For `lazy` loading, only the markers of the first and the last row are
+            checked (together with the file size), so opening a file never reads its data section.
 
         Returns
         -------
         semper : :class:`~.SemperFormat` (N=1)
             Semper file format object containing the loaded information.
 
+        Notes
+        -----
+        Every row of the picture data is stored as a record of fixed length, enclosed by 4 byte
+        record length markers, so the data section can be mapped as an array of records (see
+        `_record_dtype`) and the rows are exposed without reading the file row by row.
+
         '''
         self._log.debug('Calling from_file')
         # Construct path if filename isn't already absolute:
@@ -118,85 +148,178 @@ class SemperFormat(object):
                 os.makedirs(directory)
             filename = os.path.join(directory, filename)
         with open(filename, 'rb') as f:
-            # Read header:
-            rec_length = np.frombuffer(f.read(4), dtype=np.int32)[0]  # length of header
-            header = np.frombuffer(f.read(rec_length), dtype=np.int16)
-            ncol, nrow, nlay = header[:3]
-            iclass = header[3]
-            iform = header[4]
-            data_format = self.IFORM_DICT[iform]
-            iflag = header[5]
-            iversn, remain = divmod(iflag, 10000)
-            ilabel, ntitle = divmod(remain, 1000)
-            iformat = header[6] if len(header) == 7 else None
-            assert np.frombuffer(f.read(4), dtype=np.int32)[0] == rec_length
-            # Read title:
-            title = ''
-            if ntitle > 0:
-                assert np.frombuffer(f.read(4), dtype=np.int32)[0] == ntitle  # length of title
-                title_bytes = np.frombuffer(f.read(ntitle), dtype=np.byte)
-                title = ''.join(map(chr, title_bytes))
-                assert np.frombuffer(f.read(4), dtype=np.int32)[0] == ntitle
-            # Read label:
-            iwp, date, range_string, ipltype, a = [None] * 5  # Initialization!
-            iccoln, icrown, iclayn = [None] * 3
-            if ilabel:
-                rec_length = np.frombuffer(f.read(4), dtype=np.int32)[0]  # length of label
-                label = np.frombuffer(f.read(512), dtype=np.int16)
-                assert ''.join([chr(l) for l in label[:6]]) == 'Semper'
-                assert struct.unpack('>h', ''.join([chr(x) for x in label[6:8]]))[0] == ncol
-                assert struct.unpack('>h', ''.join([chr(x) for x in label[8:10]]))[0] == nrow
-                assert struct.unpack('>h', ''.join([chr(x) for x in label[10:12]]))[0] == nlay
-                iccoln = struct.unpack('>h', ''.join([chr(x) for x in label[12:14]]))[0]
-                icrown = struct.unpack('>h', ''.join([chr(x) for x in label[14:16]]))[0]
-                iclayn = struct.unpack('>h', ''.join([chr(x) for x in label[16:18]]))[0]
-                assert label[18] == iclass
-                assert label[19] == iform
-                iwp = label[20]
-                date = '{}-{}-{} {}:{}:{}'.format(label[21]+1900, *label[22:27])
-                # No test for ncrang, range is extracted from data itself (also prone to errors)!
-                ipltyp = label[55]  # position list type
-                real_coords = label[62]
-                dz, dy, dx, z0, y0, x0 = [1., 1., 1., 0., 0., 0.]
-                if real_coords:
-                    dz = struct.unpack('<f', ''.join([chr(x) for x in label[75:79]]))[0]
-                    z0 = struct.unpack('<f', ''.join([chr(x) for x in label[79:83]]))[0]
-                    dy = struct.unpack('<f', ''.join([chr(x) for x in label[83:87]]))[0]
-                    y0 = struct.unpack('<f', ''.join([chr(x) for x in label[87:91]]))[0]
-                    dx = struct.unpack('<f', ''.join([chr(x) for x in label[91:95]]))[0]
-                    x0 = struct.unpack('<f', ''.join([chr(x) for x in label[95:99]]))[0]
-                assert ''.join([str(unichr(l)) for l in label[100:100+ntitle]]) == title
-                ux = ''.join([chr(l) for l in label[244:248]]).replace('\x00', '')
-                uy = ''.join([chr(l) for l in label[248:252]]).replace('\x00', '')
-                uz = ''.join([chr(l) for l in label[252:256]]).replace('\x00', '')
-                assert np.frombuffer(f.read(4), dtype=np.int32)[0] == rec_length
-            # Read picture data:
-            data = np.empty((nlay, nrow, ncol), dtype=data_format)
-            for k in range(nlay):
-                for j in range(nrow):
-                    rec_length = np.frombuffer(f.read(4), dtype=np.int32)[0]  # length of row
-                    row = np.frombuffer(f.read(rec_length), dtype=data_format)
-                    data[k, j, :] = row
-                    assert np.frombuffer(f.read(4), dtype=np.int32)[0] == rec_length
-        arg_dict = {}
-        arg_dict['data'] = data
-        arg_dict['title'] = title
-        arg_dict['offsets'] = (x0, y0, z0)
-        arg_dict['scales'] = (dx, dy, dz)
-        arg_dict['units'] = (ux, uy, uz)
-        arg_dict['date'] = date
-        arg_dict['ICLASS'] = iclass
-        arg_dict['IFORM'] = iform
-        arg_dict['IVERSN'] = iversn
-        arg_dict['ILABEL'] = ilabel
-        arg_dict['IFORMAT'] = iformat
-        arg_dict['IWP'] = iwp
-        arg_dict['IPLTYP'] = ipltyp
-        arg_dict['ICCOLN'] = iccoln
-        arg_dict['ICROWN'] = icrown
-        arg_dict['ICLAYN'] = iclayn
+            shape, arg_dict = self._read_header(f)
+            data_offset = f.tell()
+        arg_dict['data'] = self._map_data(filename, shape, arg_dict['IFORM'], data_offset,
+                                          validate, full_check=not lazy)
+        if not lazy:
+            arg_dict['data'] = np.array(arg_dict['data'])  # Materialize a contiguous copy!
         return SemperFormat(arg_dict)
 
+    @classmethod
+    def load_stack(cls, filenames, n_threads=4, as_signal=True, validate=True):
+        '''Load a series of single layer `.unf`-files into one stack.
+
+        Parameters
+        ----------
+        filenames : string or list of strings
+            A glob pattern (e.g. 'session/*.unf', matching files are sorted by name) or a list of
+            the unf-files which should be stacked (in this order).
+        n_threads : int, optional
+            Number of threads which read the picture data in parallel (file I/O releases the GIL).
+            The default is 4.
+        as_signal : boolean, optional
+            If True (default), the stack is returned as a hyperspy signal (see `to_signal`),
+            otherwise as a :class:`~.SemperFormat` object.
+        validate : boolean, optional
+            Determines if the record length markers of all files are checked. Default is True.
+
+        Returns
+        -------
+        stack : :class:`~hyperspy.signals.Signal` or :class:`~.SemperFormat`
+            The stacked pictures with the files along the first (layer) axis. Title, scales and
+            units are taken from the first file.
+
+        Notes
+        -----
+        All headers are parsed before any picture data is read, so inconsistent shapes or data
+        formats are detected early. The output array is preallocated and every file is read
+        directly into its layer.
+
+        '''
+        cls._log.debug('Calling load_stack')
+        if isinstance(filenames, basestring):
+            filenames = sorted(glob.glob(filenames))
+        assert len(filenames) > 0, 'No files to load!'
+        # Parse all headers first:
+        headers = []
+        for filename in filenames:
+            with open(filename, 'rb') as f:
+                shape, arg_dict = cls._read_header(f)
+                headers.append((shape, arg_dict, f.tell()))
+        shape, arg_dict, _ = headers[0]
+        iform = arg_dict['IFORM']
+        for filename, (shape_i, arg_dict_i, _) in zip(filenames, headers):
+            assert shape_i == shape and arg_dict_i['IFORM'] == iform, \
+                'Inconsistent shape or data format in {}!'.format(filename)
+        assert shape[0] == 1, 'Only single layer files can be stacked!'
+        _, nrow, ncol = shape
+        record_dtype = cls._record_dtype(iform, ncol)
+        # Preallocate and fill the stack in parallel:
+        stack = np.empty((len(filenames), nrow, ncol), dtype=cls.IFORM_DICT[iform])
+
+        def read_layer(i):
+            with open(filenames[i], 'rb') as f:
+                f.seek(headers[i][2])
+                records = np.fromfile(f, dtype=record_dtype, count=nrow)
+            assert records.size == nrow, 'File {} is truncated!'.format(filenames[i])
+            if validate:
+                cls._validate_records(records)
+            stack[i] = records['row']
+
+        workers = ThreadPool(n_threads)
+        try:
+            workers.map(read_layer, range(len(filenames)))
+        finally:
+            workers.close()
+        arg_dict['data'] = stack
+        semper = cls(arg_dict)
+        cls._log.info('Loaded {} files into a stack of shape {}'.format(len(filenames),
+                                                                        stack.shape))
+        if as_signal:
+            return semper.to_signal()
+        return semper
+
+    @classmethod
+    def read_header(cls, filename):
+        '''Read only the header, title and label of a `.unf`-file (e.g. for directory scans).
+
+        Parameters
+        ----------
+        filename : string
+            The name of the unf-file.
+
+        Returns
+        -------
+        header : dict
+            Dictionary with the `shape` (layers, rows, columns) of the picture and the entries
+            of the `arg_dict` of a :class:`~.SemperFormat` (title, date, scales, ...) except for
+            the data.
+
+        '''
+        cls._log.debug('Calling read_header')
+        with open(filename, 'rb') as f:
+            shape, arg_dict = cls._read_header(f)
+        arg_dict['shape'] = shape
+        return arg_dict
+
+    @classmethod
+    def _read_header(cls, f):
+        # Read header, title and label from the beginning of an open file, the file position is
+        # left at the start of the picture data. Returns the shape (nlay, nrow, ncol) of the
+        # picture and the arg_dict without the data.
+        # Read header:
+        rec_length = struct.unpack('<I', f.read(4))[0]  # length of header
+        header = np.frombuffer(f.read(rec_length), dtype='<i2')
+        assert struct.unpack('<I', f.read(4))[0] == rec_length
+        ncol, nrow, nlay, iclass, iform, iflag = [int(h) for h in header[:6]]
+        assert iform in cls.IFORM_DICT, 'Unknown data format!'
+        iversn, remain = divmod(iflag, 10000)
+        ilabel, ntitle = divmod(remain, 1000)
+        iformat = int(header[6]) if len(header) == 7 else None
+        # Read title:
+        title = ''
+        if ntitle > 0:
+            assert struct.unpack('<I', f.read(4))[0] == ntitle  # length of title
+            title = f.read(ntitle)
+            assert struct.unpack('<I', f.read(4))[0] == ntitle
+        arg_dict = {'title': title, 'offsets': (0., 0., 0.), 'scales': (1., 1., 1.),
+                    'units': ('', '', ''), 'date': None, 'ICLASS': iclass, 'IFORM': iform,
+                    'IVERSN': iversn, 'ILABEL': ilabel, 'IFORMAT': iformat, 'IWP': None,
+                    'IPLTYP': None, 'ICCOLN': None, 'ICROWN': None, 'ICLAYN': None}
+        # Read label:
+        if ilabel:
+            assert struct.unpack('<I', f.read(4))[0] == 512  # length of label
+            label_bytes = np.frombuffer(f.read(512), dtype='<i2').astype(np.uint8)
+            assert struct.unpack('<I', f.read(4))[0] == 512
+            label = label_bytes.view(cls.LABEL_DTYPE)[0]
+            assert label['ident'] == 'Semper'
+            assert (label['ncol'], label['nrow'], label['nlay']) == (ncol, nrow, nlay)
+            assert (label['iclass'], label['iform']) == (iclass, iform)
+            assert label['title'] == title
+            # No test for ncrang, range is extracted from data itself (also prone to errors)!
+            date = label['date']
+            arg_dict['date'] = '{}-{}-{} {}:{}:{}'.format(date[0]+1900, *date[1:])
+            if label['real_coords']:
+                arg_dict['offsets'] = tuple(float(label[k]) for k in ('x0', 'y0', 'z0'))
+                arg_dict['scales'] = tuple(float(label[k]) for k in ('dx', 'dy', 'dz'))
+            arg_dict['units'] = (label['ux'], label['uy'], label['uz'])
+            arg_dict['IWP'] = int(label['iwp'])
+            arg_dict['IPLTYP'] = int(label['ipltyp'])  # position list type
+            arg_dict['ICCOLN'] = int(label['iccoln'])
+            arg_dict['ICROWN'] = int(label['icrown'])
+            arg_dict['ICLAYN'] = int(label['iclayn'])
+        return (nlay, nrow, ncol), arg_dict
+
+    @classmethod
+    def _map_data(cls, filename, shape, iform, data_offset, validate=True, full_check=True):
+        # Map picture data (fixed record stride, the markers are skipped by the strided view):
+        nlay, nrow, ncol = shape
+        record_dtype = cls._record_dtype(iform, ncol)
+        assert os.path.getsize(filename) >= data_offset + nlay*nrow*record_dtype.itemsize, \
+            'File is too small for the picture size given in the header!'
+        records = np.memmap(filename, dtype=record_dtype, mode='r', offset=data_offset,
+                            shape=(nlay, nrow))
+        if validate:  # Check all record length markers at once (or only the outermost ones):
+            cls._validate_records(records if full_check else records.ravel()[[0, -1]])
+        return records['row']
+
+    @staticmethod
+    def _validate_records(records):
+        rec_length = records.dtype['row'].itemsize
+        markers = np.concatenate((records['start'].ravel(), records['end'].ravel()))
+        assert np.all(markers == rec_length), 'Corrupted record length markers!'
+
     def to_file(self, filename='semper.unf', skip_header=False):
         '''Save a :class:`~.SemperFormat` to a file.
 
@@ -212,8 +335,17 @@ class SemperFormat(object):
         -------
         None
 
+        Raises
+        ------
+        ValueError
+            If the title, the date or the units do not fit into the header and label (titles are
+            limited to 144 characters if a label is written, units to 4 characters and years to
+            1900-2155), so no incomplete or silently truncated file is written.
+
         '''
         self._log.debug('Calling to_file')
+        if not skip_header:
+            self._check_header()
         # Construct path if filename isn't already absolute:
         if not os.path.isabs(filename):
             from pyramid import DIR_FILES
@@ -234,71 +366,74 @@ class SemperFormat(object):
                     header.append(self.iformat)
                 # Write header:
                 f.write(struct.pack('I', 2*len(header)))  # record length, 4 byte format!
-                for element in header:
-                    f.write(struct.pack('h', element))  # 2 byte format!
+                f.write(np.array(header, dtype='<i2').tostring())  # 2 byte format!
                 f.write(struct.pack('I', 2*len(header)))  # record length!
                 # Write title:
-                f.write(struct.pack('I', len(self.title)))  # record length, 4 byte format!
-                f.write(self.title)
-                f.write(struct.pack('I', len(self.title)))  # record length, 4 byte format!
-                # Create label:
-                if self.ilabel:
-                    label = np.zeros(256, dtype=np.int32)
-                    label[:6] = [ord(c) for c in 'Semper']
-                    label[6:8] = divmod(ncol, 256)
-                    label[8:10] = divmod(nrow, 256)
-                    label[10:12] = divmod(nlay, 256)
-                    label[12:14] = divmod(self.iccoln, 256)
-                    label[14:16] = divmod(self.icrown, 256)
-                    label[16:18] = divmod(self.iclayn, 256)
-                    label[18] = self.iclass
-                    label[19] = self.iform
-                    label[20] = self.iwp
-                    year, time = self.date.split(' ')
-                    label[21:24] = map(int, year.split('-'))
-                    label[21] -= 1900
-                    label[24:27] = map(int, time.split(':'))
-                    range_string = '{:.4g},{:.4g}'.format(self.data.min(), self.data.max())
-                    ncrang = len(range_string)
-                    label[27] = ncrang
-                    label[28:28+ncrang] = [ord(c) for c in range_string]
-                    label[55] = self.ipltyp
-                    label[62] = 1  # Use real coords!
-                    label[75:79] = [ord(c) for c in struct.pack('<f', self.scales[2])]  # DZ
-                    label[79:83] = [ord(c) for c in struct.pack('<f', self.offsets[2])]  # Z0
-                    label[83:87] = [ord(c) for c in struct.pack('<f', self.scales[1])]  # DY
-                    label[87:91] = [ord(c) for c in struct.pack('<f', self.offsets[1])]  # Y0
-                    label[91:95] = [ord(c) for c in struct.pack('<f', self.scales[0])]  # DX
-                    label[95:99] = [ord(c) for c in struct.pack('<f', self.offsets[0])]  # X0
-                    label[100:100+len(self.title)] = [ord(s) for s in self.title]
-                    label[244:248] = [ord(c) for c in self.units[0]] + [0]*(4-len(self.units[0]))
-                    label[248:252] = [ord(c) for c in self.units[1]] + [0]*(4-len(self.units[1]))
-                    label[252:256] = [ord(c) for c in self.units[2]] + [0]*(4-len(self.units[2]))
+                if self.title:  # the title record is omitted for empty titles!
+                    f.write(struct.pack('I', len(self.title)))  # record length, 4 byte format!
+                    f.write(self.title)
+                    f.write(struct.pack('I', len(self.title)))  # record length, 4 byte format!
                 # Write label:
                 if self.ilabel:
                     f.write(struct.pack('I', 2*256))  # record length, 4 byte format!
-                    for element in label:
-                        f.write(struct.pack('h', element))  # 2 byte format!
+                    f.write(self._create_label().view(np.uint8).astype('<i2').tostring())
                     f.write(struct.pack('I', 2*256))  # record length!
             # Write picture data:
-            for k in range(nlay):
-                for j in range(nrow):
-                    row = self.data[k, j, :]
-                    factor = 8 if self.iform == 3 else 4  # complex numbers need more space!
-                    f.write(struct.pack('I', factor*ncol))  # record length, 4 byte format!
-                    if self.iform == 0:  # bytes:
-                        raise Exception('Byte data is not supported! Use int, float or complex!')
-                    elif self.iform == 1:  # int:
-                        for element in row:
-                            f.write(struct.pack('i', element))  # 4 bytes per data entry!
-                    elif self.iform == 2:  # float:
-                        for element in row:
-                            f.write(struct.pack('f', element))  # 4 bytes per data entry!
-                    elif self.iform == 3:  # complex:
-                        for element in row:
-                            f.write(struct.pack('f', element.real))  # 4 bytes per data entry!
-                            f.write(struct.pack('f', element.imag))  # 4 bytes per data entry!
-                    f.write(struct.pack('I', factor*ncol))  # record length, 4 byte format!
+            if self.iform == 0:  # bytes:
+                raise Exception('Byte data is not supported! Use int, float or complex!')
+            records = np.empty(nrow, dtype=self._record_dtype(self.iform, ncol))
+            records['start'] = records['end'] = records.dtype['row'].itemsize  # record length!
+            for k in range(nlay):  # one layer at a time, records are written as a whole:
+                records['row'] = self.data[k, :, :]
+                records.tofile(f)
+
+    def _check_header(self):
+        # Check that title, date and units fit into the header and label without truncation:
+        max_title = self.LABEL_DTYPE['title'].itemsize if self.ilabel else 999
+        if len(self.title) > max_title:
+            raise ValueError('Title has {} characters, only {} can be stored!'.format(
+                len(self.title), max_title))
+        if self.ilabel:
+            year = self.date.split('-')[0]
+            if not (len(year) == 4 and 1900 <= int(year) <= 1900+255):
+                raise ValueError('Year of the date {!r} has to be given with 4 digits '
+                                 'between 1900 and 2155!'.format(self.date))
+            max_units = self.LABEL_DTYPE['ux'].itemsize
+            for unit in self.units:
+                if len(unit) > max_units:
+                    raise ValueError('Unit {!r} is longer than {} characters!'.format(
+                        unit, max_units))
+
+    def _create_label(self):
+        # Fill the label record (one byte per entry, see LABEL_DTYPE):
+        nlay, nrow, ncol = self.data.shape
+        label = np.zeros(1, dtype=self.LABEL_DTYPE)
+        label['ident'] = 'Semper'
+        label['ncol'], label['nrow'], label['nlay'] = ncol, nrow, nlay
+        label['iccoln'], label['icrown'], label['iclayn'] = self.iccoln, self.icrown, self.iclayn
+        label['iclass'] = self.iclass
+        label['iform'] = self.iform
+        label['iwp'] = self.iwp
+        year, time = self.date.split(' ')
+        date = map(int, year.split('-') + time.split(':'))
+        date[0] -= 1900
+        label['date'] = date
+        range_string = '{:.4g},{:.4g}'.format(self.data.min(), self.data.max())
+        label['ncrang'] = len(range_string)
+        label['range'] = range_string
+        label['ipltyp'] = self.ipltyp
+        label['real_coords'] = 1  # Use real coords!
+        label['dx'], label['dy'], label['dz'] = self.scales
+        label['x0'], label['y0'], label['z0'] = self.offsets
+        label['title'] = self.title
+        label['ux'], label['uy'], label['uz'] = self.units
+        return label
+
+    @classmethod
+    def _record_dtype(cls, iform, ncol):
+        # Data row of ncol entries, enclosed by the record length markers (4 byte format):
+        return np.dtype([('start', np.uint32), ('row', cls.IFORM_DICT[iform], (ncol,)),
+                         ('end', np.uint32)])
 
     @classmethod
     def from_signal(cls, signal):
@@ -329,7 +464,7 @@ class SemperFormat(object):
         arg_dict['offsets'] = offsets
         arg_dict['scales'] = scales
         arg_dict['units'] = units
-        arg_dict['date'] = strftime('%y-%m-%d %H:%M:%S')
+        arg_dict['date'] = strftime('%Y-%m-%d %H:%M:%S')
         arg_dict['ICLASS'] = iclass
         arg_dict['IFORM'] = iform
         arg_dict['IVERSN'] = 2  # current standard
@@ -11,7 +11,8 @@ import matplotlib.cm as cm
 import utils
 from matplotlib.patches import Rectangle
 from scipy.fftpack import ifft2,fftshift,fft2,ifftshift
-from scipy.signal import correlate2d, medfilt
+from scipy.signal import correlate2d
+from scipy.ndimage import median_filter
 from skimage.feature import register_translation
 from scipy.misc import imresize
 
@@ -214,39 +215,72 @@ def align_img(img_one, img_two, method = 'imgreg', show=False, roi=True, sb_filt
     return (img_algn, (xdrift, ydrift))
 
 
-def rm_duds(img, sigma=8.0, median_k=5):
+def rm_duds(img, sigma=8.0, median_k=5, dud_map=None, out=None):
     '''
-    Removes dud pixels from images
+    Removes dud pixels from spectra, images or image stacks
 
     Parameters
     ----------
     img : ndarray
-        The image
+        The spectrum (1D), image (2D) or stack of images (3D, first axis is the stack axis)
     sigma : float
-
+        Threshold in units of the local robust standard deviation (1.4826 * local MAD)
     median_k : int
         Size of median kernel
+    dud_map : ndarray of bool, optional
+        Precomputed map of dead/hot pixels (e.g. from a gain reference), which are always
+        replaced. Has either the shape of `img` or, for stacks, the shape of one frame.
+    out : ndarray, optional
+        Array in which the result is stored. If None, `img` is modified in place.
 
     Returns
     -------
     img_nodud : ndarray
         Image with removed dud pixels (e.g. X-Rays spikes)
+    duds : ndarray of bool
+        Map of the replaced pixels
 
     Notes
     -----
+    The median and the median absolute deviation (MAD) are both computed in a local window of
+    size `median_k` with :func:`scipy.ndimage.median_filter`, stacks are filtered frame by
+    frame. The MAD is bounded from below by the global MAD of the deviations to avoid flagging
+    every pixel in flat (e.g. integer valued, noise free) regions.
 
     See Also
     --------
+    ercpy.detector.DefectMap
 
     '''
-    # TODO: check if 1D for spectrum works as well
-    img_mf = medfilt(img, median_k) # median filtered image
-    diff_img = np.absolute(img-img_mf)
-    mean_diff = sigma*np.sqrt(np.var(diff_img))
-    duds = diff_img > mean_diff
-    img[duds] = img_mf[duds]
-
-    n_duds = np.sum(duds) # dud pixels
-    print "The number of pixels changed = %d" % n_duds
-
-    return (img, duds)
\ No newline at end of file
+    img_mf, duds = _find_duds(img, sigma, median_k)
+    if dud_map is not None:
+        duds |= np.broadcast_to(np.asarray(dud_map, dtype=bool), duds.shape)
+    if out is None:
+        out = img
+    elif out is not img:
+        out[...] = img
+    out[duds] = img_mf[duds]
+
+    n_duds = np.sum(duds)  # dud pixels
+    print("The number of pixels changed = %d" % n_duds)
+
+    return (out, duds)
+
+
+def _find_duds(img, sigma, median_k):
+    '''Return the median filtered image and the map of pixels deviating more than `sigma`
+    robust standard deviations from the local median.'''
+    img = np.asarray(img)
+    if img.ndim == 3:  # stack of images, do not filter along the stack axis:
+        size = (1, median_k, median_k)
+    else:
+        size = median_k
+    img_mf = median_filter(img, size=size, mode='reflect')  # median filtered image
+    diff_img = np.absolute(img.astype(np.float64) - img_mf)
+    mad = median_filter(diff_img, size=size, mode='reflect')  # local MAD
+    mad_floor = np.median(diff_img)
+    if mad_floor == 0:
+        mad_floor = np.finfo(np.float32).eps
+    np.maximum(mad, mad_floor, out=mad)
+    duds = diff_img > sigma*1.4826*mad
+    return (img_mf, duds)
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+# Copyright 2015 by Forschungszentrum Juelich GmbH
+#
+"""This module provides the :class:`~.Pipeline` class for frame by frame processing of stacks."""
+
+
+import os
+import glob
+import pickle
+import itertools
+from collections import deque
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+
+import logging
+
+
+__all__ = ['Pipeline']
+
+
+class Pipeline(object):
+
+    '''Class for chaining processing steps which are applied lazily to every frame of a stack.
+
+    A :class:`~.Pipeline` consists of a source (an iterable of frames, e.g. a stack or a list of
+    files) and a chain of stages, which are declared with :func:`~.map` and only executed when
+    the pipeline is iterated, collected or saved. Every frame passes through all stages in a
+    worker of a thread or process pool, while the main thread reads the next frames and writes
+    the finished ones. At most `max_queued` frames are in flight at any time, so the memory
+    consumption does not depend on the length of the stack and the results keep their order.
+
+    Attributes
+    ----------
+    source: iterable
+        The input frames (e.g. an array or memory map, which is iterated along its first axis).
+    stages: tuple
+        The stages as tuples of the function and its additional arguments and keyword arguments.
+    n_workers: int
+        Number of workers, 1 processes all frames in the calling thread.
+    processes: boolean
+        If True, a process pool is used instead of a thread pool.
+    max_queued: int
+        Maximum number of frames which are processed or waiting to be written.
+
+    Notes
+    -----
+    Numpy, scipy (FFTs) and file I/O release the GIL for most of the work, so threads (default)
+    are usually sufficient. Pure Python stages profit from processes, which need picklable stages
+    (functions defined on module level, no lambdas, nested functions or :mod:`operator` objects
+    like :func:`~operator.itemgetter`) and copy every frame to the workers. Stages which can not
+    be pickled are reported as TypeError before any frame is processed.
+
+    Examples
+    --------
+    Functions with several results are wrapped on module level, so they also work with processes:
+
+    >>> def reconstructed_phase(holo, ref, rec_param):
+    ...     return unwrap(holo_reconstruct(holo, ref, rec_param)[1])
+    >>> def aligned(img, reference):
+    ...     return align_img(img, reference)[0]
+    >>> pipeline = (Pipeline.from_files('session/*.unf', n_workers=8)
+    ...             .map(reconstructed_phase, ref, rec_param).map(aligned, reference))
+    >>> pipeline.save_to_emd('session.emd', 'phase')
+
+    '''
+
+    _log = logging.getLogger(__name__)
+
+    def __init__(self, source, stages=(), n_workers=4, processes=False, max_queued=None):
+        self._log.debug('Calling __init__')
+        self.source = source
+        self.stages = tuple(stages)
+        self.n_workers = n_workers
+        self.processes = processes
+        if max_queued is None:
+            max_queued = 2 * n_workers
+        assert max_queued >= n_workers, 'At least one frame per worker has to be queued!'
+        self.max_queued = max_queued
+        self._log.debug('Created '+str(self))
+
+    def __repr__(self):
+        return 'Pipeline(stages=[{}], n_workers={}, processes={}, max_queued={})'.format(
+            ', '.join(getattr(func, '__name__', repr(func)) for func, _, _ in self.stages),
+            self.n_workers, self.processes, self.max_queued)
+
+    @classmethod
+    def from_files(cls, filenames, **kwargs):
+        '''Create a pipeline over a series of single layer `.unf`-files.
+
+        Parameters
+        ----------
+        filenames : string or list of strings
+            A glob pattern (matching files are sorted by name) or a list of `.unf`-files. Relative
+            paths are resolved against the current working directory when the pipeline is created.
+        **kwargs
+            Further arguments of the :class:`~.Pipeline` (e.g. `n_workers`).
+
+        Returns
+        -------
+        pipeline : :class:`~.Pipeline`
+            The pipeline whose first stage reads the files (in the workers, so reading overlaps
+            with the processing of other frames).
+
+        '''
+        cls._log.debug('Calling from_files')
+        if isinstance(filenames, basestring):
+            filenames = sorted(glob.glob(filenames))
+        assert len(filenames) > 0, 'No files to load!'
+        # from_file would look up relative paths in the pyramid file directory:
+        filenames = [os.path.abspath(filename) for filename in filenames]
+        return cls(filenames, **kwargs).map(_read_semper)
+
+    def map(self, func, *args, **kwargs):
+        '''Add a stage to the pipeline.
+
+        Parameters
+        ----------
+        func : function
+            The function which is applied to every frame as `func(frame, *args, **kwargs)`. Its
+            result is the input of the next stage.
+        *args, **kwargs
+            Additional arguments of `func`, which are the same for every frame.
+
+        Returns
+        -------
+        pipeline : :class:`~.Pipeline`
+            A new pipeline with the additional stage (the pipeline itself is not changed).
+
+        '''
+        return Pipeline(self.source, self.stages + ((func, args, kwargs),), self.n_workers,
+                        self.processes, self.max_queued)
+
+    def __iter__(self):
+        '''Process the frames and yield the results in the order of the source.'''
+        self._log.debug('Calling __iter__')
+        if self.n_workers == 1:
+            for item in self.source:
+                yield _apply_stages(self.stages, item)
+            return
+        if self.processes:  # unpicklable tasks would never reach the workers (no error!):
+            try:
+                pickle.dumps(self.stages, pickle.HIGHEST_PROTOCOL)
+            except Exception as e:
+                raise TypeError('Stages can not be sent to worker processes ({})!'.format(e))
+        workers = (Pool if self.processes else ThreadPool)(self.n_workers)
+        try:
+            pending = deque()
+            for item in self.source:
+                if len(pending) >= self.max_queued:
+                    yield pending.popleft().get()
+                pending.append(workers.apply_async(_apply_stages, (self.stages, item)))
+            while pending:
+                yield pending.popleft().get()
+        finally:  # also reached on errors or if the iteration is stopped early:
+            workers.terminate()
+            workers.join()
+
+    def collect(self):
+        '''Process all frames and return the results as one stack.
+
+        Returns
+        -------
+        stack : :class:`~numpy.ndarray`
+            The stacked results of all frames (the complete stack is held in memory, use
+            :func:`~.save_to_emd` for long series).
+
+        '''
+        self._log.debug('Calling collect')
+        return np.array(list(self))
+
+    def save_to_emd(self, filename, name, axes=None, metadata={}, dtype=None, flush=False,
+                    **options):
+        '''Process all frames and write the results into a signal of an emd-file.
+
+        Parameters
+        ----------
+        filename : string
+            The name of the emd-file (other signals in an existing file are kept).
+        name : string
+            The name of the signal in the `data` group.
+        axes : list of dictionaries, optional
+            The calibration of the stack (frame axis first), see
+            :class:`~ercpy.formats.emd.EMDStreamWriter`.
+        metadata : dictionary, optional
+            Attributes of the signal group.
+        dtype : string or :class:`~numpy.dtype`, optional
+            The dtype of the dataset. The default is the dtype of the first result.
+        flush : boolean, optional
+            If True, the file is flushed after every frame. Default is False.
+        **options
+            Dataset options (`chunks`, `compression`, `compression_opts`, `shuffle`) of the
+            :class:`~ercpy.formats.emd.EMDStreamWriter`.
+
+        Returns
+        -------
+        n_frames : int
+            The number of written frames.
+
+        '''
+        self._log.debug('Calling save_to_emd')
+        from .formats.emd import EMDStreamWriter
+        results = iter(self)
+        first = next(results, None)
+        assert first is not None, 'No frames to save!'
+        first = np.asarray(first)
+        if dtype is None:
+            dtype = first.dtype
+        with EMDStreamWriter(filename, name, first.shape, dtype, axes, metadata,
+                             **options) as writer:
+            for frame in itertools.chain([first], results):
+                writer.append(frame, flush=flush)
+            n_frames = len(writer)
+        self._log.info('Wrote {} frames to {}'.format(n_frames, filename))
+        return n_frames
+
+
+def _apply_stages(stages, item):
+    # Pass one frame through all stages (on module level, so process pools can pickle it):
+    for func, args, kwargs in stages:
+        item = func(item, *args, **kwargs)
+    return item
+
+
+def _read_semper(filename):
+    # Read the single layer of a Semper file as a 2D frame:
+    from .formats.semper import SemperFormat
+    data = SemperFormat.from_file(filename).data
+    assert data.shape[0] == 1, 'Only single layer files can be used as frames!'
+    return data[0]
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""Testcase for the result cache."""
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from ercpy import config
+from ercpy.cache import ResultCache, memoize
+
+
+CALLS = []
+
+
+def process(img, factor=2., shift=(0, 0)):
+    CALLS.append(factor)
+    return img*factor, (np.roll(img, shift[0], axis=0), shift), None, 'done'
+
+
+def make_power(exponent):
+    def power(img):  # same name and code for every exponent!
+        return img**exponent
+    return power
+
+
+class TestCaseCache(unittest.TestCase):
+    """TestCase for the ResultCache class and the memoize decorator."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache = ResultCache(os.path.join(self.tmpdir, 'cache'), max_size=2**20)
+        del CALLS[:]
+        self.calls = CALLS
+        self.process = memoize(process, cache=self.cache)
+        self.img = np.arange(12, dtype=np.float32).reshape((3, 4))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_memoize(self):
+        result = self.process(self.img, shift=(1, 0))
+        result_cached = self.process(self.img, 2., shift=(1, 0))  # same call, other signature!
+        self.assertEqual(self.calls, [2.])
+        assert_array_equal(result_cached[0], self.img*2.)
+        assert_array_equal(result_cached[1][0], result[1][0])
+        self.assertEqual(result_cached[1][1], (1, 0))
+        self.assertEqual(result_cached[2:], (None, 'done'))
+        # Changed parameters or data have to be evaluated again:
+        self.process(self.img, factor=3.)
+        self.process(self.img.astype(np.float64))
+        img = self.img.copy()
+        img[0, 0] = -1
+        self.process(img)
+        self.assertEqual(self.calls, [2., 3., 2., 2.])
+        self.assertEqual(len(self.cache), 4)
+        self.assertIs(self.process.uncached(self.img)[2], None)
+        self.assertEqual(len(self.calls), 5)
+
+    def test_function_identity(self):
+        img = np.arange(3)
+        double = memoize(lambda x: x*2, cache=self.cache)
+        square = memoize(lambda x: x**2, cache=self.cache)
+        assert_array_equal(double(img), [0, 2, 4])
+        assert_array_equal(square(img), [0, 1, 4])
+        cube = memoize(make_power(3), cache=self.cache)
+        assert_array_equal(memoize(make_power(2), cache=self.cache)(img), [0, 1, 4])
+        assert_array_equal(cube(img), [0, 1, 8])
+        self.assertIs(cube.cache, self.cache)
+        self.assertEqual(len(self.cache), 4)
+
+    def test_masked_and_corrupt(self):
+        img = np.ma.masked_array(self.img, self.img > 5)
+        result = self.process(img)[0]
+        self.process(np.ma.masked_array(self.img, self.img > 6))
+        self.assertEqual(len(self.calls), 2)
+        result_cached = self.process(img)[0]
+        self.assertEqual(len(self.calls), 2)
+        assert_array_equal(result_cached.mask, result.mask)
+        assert_array_equal(result_cached.data, result.data)
+        key = self.cache.key(process, (self.img,))
+        self.process(self.img)
+        with open(self.cache._path(key), 'r+b') as npz_file:
+            npz_file.truncate(100)
+        self.assertRaises(KeyError, self.cache.get, key)
+        self.assertNotIn(key, self.cache)
+        self.process(self.img)
+        self.assertEqual(len(self.calls), 4)
+
+    def test_not_cacheable(self):
+        identity = memoize(lambda value: value, cache=self.cache)
+        value = object()
+        self.assertIs(identity(value), value)  # argument can not be hashed
+        self.assertEqual(identity({'a': 1}), {'a': 1})  # result can not be stored
+        self.assertEqual(len(self.cache), 0)
+
+    def test_evict(self):
+        keys = []
+        self.cache.max_size = 2**30
+        for i in range(4):
+            keys.append(self.cache.key(np.ones, (i,)))
+            self.cache.set(keys[-1], np.ones((2**16,)))  # 512 KiB each
+            os.utime(self.cache._path(keys[-1]), (i, i))
+        self.cache.max_size = 2**20
+        self.cache.get(keys[0])  # recently used, so the second one is removed first!
+        self.cache.set('last', np.ones(10))
+        self.assertEqual([key in self.cache for key in keys], [True, False, False, False])
+        self.assertLessEqual(self.cache.size, self.cache.max_size)
+        self.assertRaises(KeyError, self.cache.get, keys[1])
+        self.cache.clear()
+        self.assertEqual(len(self.cache), 0)
+
+    def test_default_config(self):
+        directory, size = config.CACHE_DIR, config.CACHE_SIZE
+        cache = ResultCache()
+        cached_process = memoize(process)
+        try:  # the configuration is read when the cache is used, not on import or creation:
+            config.CACHE_DIR = os.path.join(self.tmpdir, 'default')
+            config.CACHE_SIZE = 2**20
+            self.assertEqual((cache.directory, cache.max_size), (config.CACHE_DIR, 2**20))
+            self.assertEqual(len(cache), 0)
+            self.assertFalse(os.path.exists(config.CACHE_DIR))  # only created when storing!
+            cached_process(self.img)
+            self.assertEqual(len(cached_process.cache), 1)
+            self.assertTrue(os.path.isdir(config.CACHE_DIR))
+        finally:
+            config.CACHE_DIR, config.CACHE_SIZE = directory, size
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestCaseCache)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""Testcase for the convert module."""
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from ercpy.formats.convert import convert_directory, main
+from ercpy.formats.emd import EMD
+from ercpy.formats.semper import SemperFormat
+
+from test_semper import semper_object
+
+
+class TestCaseConvert(unittest.TestCase):
+    """TestCase for the batch conversion between Semper and EMD files."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.source = os.path.join(self.tmpdir, 'unf')
+        os.makedirs(os.path.join(self.source, 'session'))
+        rng = np.random.RandomState(42)
+        self.data = {'single': rng.rand(1, 5, 7).astype(np.float32),
+                     'stack': rng.randint(0, 100, (3, 5, 7)).astype(np.int32)}
+        for name, data in self.data.items():
+            semper_object(data, title=name).to_file(
+                os.path.join(self.source, 'session', name+'.unf'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_roundtrip(self):
+        emd_dir = os.path.join(self.tmpdir, 'emd')
+        stats = convert_directory(self.source, emd_dir, 'emd', n_processes=2,
+                                  compression='gzip')
+        self.assertEqual((stats['n_files'], stats['n_written'], stats['failed']), (2, 2, []))
+        header = EMD.read_header(os.path.join(emd_dir, 'session', 'single.emd'))
+        signal = header['signals']['single']
+        self.assertEqual(signal['shape'], (5, 7))
+        self.assertEqual([axis['scale'] for axis in signal['axes']], [.5, 1.])
+        stats = convert_directory(emd_dir, os.path.join(self.tmpdir, 'back'), 'unf',
+                                  n_processes=1)
+        self.assertEqual(stats['n_written'], 2)
+        for name, data in self.data.items():
+            filename = os.path.join(self.tmpdir, 'back', 'session', '{0}_{0}.unf'.format(name))
+            semper = SemperFormat.from_file(filename)
+            assert_array_equal(semper.data, data)
+            self.assertEqual(semper.scales, (1., .5, .25 if name == 'stack' else 1.))
+            self.assertEqual(semper.title, name)
+
+    def test_main(self):
+        emd_dir = os.path.join(self.tmpdir, 'emd')
+        self.assertEqual(main([self.source, emd_dir, '-j', '1']), 0)
+        stats = convert_directory(self.source, emd_dir, 'emd', n_processes=1)
+        self.assertEqual(stats['n_written'], 0)  # existing files are skipped!
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestCaseConvert)
+    unittest.TextTestRunner(verbosity=2).run(suite)
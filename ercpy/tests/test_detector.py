@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""Testcase for the detector module."""
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from ercpy.detector import DefectMap
+
+
+class TestCaseDefectMap(unittest.TestCase):
+    """TestCase for the persistent detector defect map."""
+
+    def setUp(self):
+        rng = np.random.RandomState(42)
+        self.series = rng.poisson(20, (8, 32, 32)).astype(np.uint16)
+        self.series[:, 5, 5] = 4000  # hot pixel
+        self.series[:, 0, 0] = 0  # dead pixel
+        self.series[3, 20, 20] = 4000  # transient spike
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_from_series(self):
+        defect_map = DefectMap.from_series(self.series)
+        assert_array_equal(defect_map.indices, [0, 5*32+5])
+        self.assertFalse(defect_map.mask[20, 20])
+
+    def test_from_single_frame(self):
+        defect_map = DefectMap.from_series(self.series[0])
+        self.assertEqual(defect_map.shape, (32, 32))
+        self.assertTrue(defect_map.mask[5, 5])
+        defect_map = DefectMap.from_series(self.series[:, 5], frame_ndim=1)
+        self.assertEqual(defect_map.shape, (32,))
+        assert_array_equal(defect_map.indices, [5])
+
+    def test_apply(self):
+        defect_map = DefectMap.from_series(self.series)
+        stack = defect_map.apply(self.series.copy())
+        self.assertTrue(np.all(stack[:, 5, 5] < 100))
+        self.assertTrue(np.all(stack[:, 0, 0] > 0))
+        self.assertEqual(stack[3, 20, 20], 4000)
+
+    def test_no_valid_neighbours(self):
+        mask = np.ones((3, 3), dtype=bool)
+        mask[0, 0] = False
+        frame = np.arange(9.).reshape((3, 3))
+        result = DefectMap.from_mask(mask).apply(frame.copy())
+        self.assertEqual(result[2, 2], 8.)  # no valid neighbour, left untouched!
+        self.assertEqual(result[0, 1], 0.)
+
+    def test_emd_roundtrip(self):
+        filename = os.path.join(self.tmpdir, 'defects.emd')
+        defect_map = DefectMap.from_series(self.series)
+        defect_map.to_emd(filename)
+        defect_map_loaded = DefectMap.from_emd(filename)
+        self.assertEqual(defect_map_loaded.shape, defect_map.shape)
+        assert_array_equal(defect_map_loaded.indices, defect_map.indices)
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestCaseDefectMap)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""Testcase for the eelsedx module."""
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import h5py
+from numpy.testing import assert_allclose, assert_array_equal
+
+from scipy.optimize import nnls
+
+from ercpy.eelsedx import VCA_decomposition, truncated_svd, abundance_maps, endmember_spectra
+from ercpy.eelsedx import estimate_nbr_compo, Nbr_compotokeep
+from ercpy.eelsedx import _endmember_indices, _pixel_subspace, _preprocess
+
+
+def synthetic_spectrum_image(shape=(20, 20), n_channels=100, n_compo=3, noise=0.01, seed=0):
+    """Linear mixture of random non-negative endmember spectra with Dirichlet abundances."""
+    rng = np.random.RandomState(seed)
+    endmembers = np.abs(rng.randn(n_compo, n_channels))
+    abundances = rng.dirichlet(np.ones(n_compo), int(np.prod(shape)))
+    data = np.dot(abundances, endmembers) + noise*rng.rand(abundances.shape[0], n_channels)
+    return data.reshape(shape + (n_channels,)) + 1, endmembers, abundances
+
+
+class DecomposedSignal(object):
+    """Minimal stand-in for a decomposed hyperspy signal (explained variance ratio only)."""
+
+    class Ratio(object):
+        def __init__(self, data):
+            self.data = data
+
+    def __init__(self, ratio):
+        self.ratio = ratio
+
+    def get_explained_variance_ratio(self):
+        return self.Ratio(self.ratio)
+
+
+class SignalLike(object):
+    """Minimal stand-in for a hyperspy signal (data and axes_manager only)."""
+
+    def __init__(self, data):
+        self.data = data
+        self.axes_manager = None
+
+
+class TestCaseVCA(unittest.TestCase):
+    """TestCase for the VCA decomposition."""
+
+    def setUp(self):
+        self.data, self.endmembers, self.abundances = synthetic_spectrum_image()
+
+    def test_VCA_decomposition(self):
+        data = self.data.copy()
+        np.random.seed(0)
+        result = VCA_decomposition(data, 3)
+        self.assertEqual(result.shape, (400, 3))
+        self.assertTrue(np.all(np.isfinite(result)))
+        assert_array_equal(data, self.data)  # input is not modified!
+
+    def test_VCA_decomposition_float32(self):
+        np.random.seed(0)
+        result = VCA_decomposition(self.data.astype(np.float32), 3, dtype='float32')
+        self.assertEqual(result.dtype, np.float32)
+
+    def test_pixel_subspace_covariance(self):
+        T_data = self.data.reshape((-1, self.data.shape[-1]))
+        U_p, S_p, xRot_p = _pixel_subspace(T_data, 3, 'pixel')
+        U_c, S_c, xRot_c = _pixel_subspace(T_data, 3, 'channel')
+        assert_allclose(S_c, S_p)
+        assert_allclose(np.dot(U_c, xRot_c), np.dot(U_p, xRot_p), atol=1e-10)
+
+    def test_truncated_svd(self):
+        T_data = self.data.reshape((-1, self.data.shape[-1]))
+        _, s_ref, Vt_ref = np.linalg.svd(T_data, full_matrices=False)
+        for svd_solver in ['arpack', 'randomized', 'incremental']:
+            U, s, Vt = truncated_svd(T_data, 3, svd_solver, seed=0, chunk_size=64)
+            assert_allclose(s, s_ref[:3], rtol=1e-3, err_msg=svd_solver)
+            assert_allclose(np.abs(np.sum(Vt*Vt_ref[:3], axis=1)), 1, rtol=1e-3,
+                            err_msg=svd_solver)
+            assert_allclose(np.dot(U*s, Vt), np.dot(T_data, np.dot(Vt.T, Vt)), atol=1e-8)
+
+    def test_truncated_svd_seed(self):
+        T_data = self.data.reshape((-1, self.data.shape[-1]))
+        U_1, s_1, Vt_1 = truncated_svd(T_data, 3, 'randomized', seed=42)
+        U_2, s_2, Vt_2 = truncated_svd(T_data, 3, 'randomized', seed=42)
+        assert_array_equal(U_1, U_2)
+        assert_array_equal(Vt_1, Vt_2)
+
+    def test_VCA_decomposition_h5py(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(tmpdir, 'spectrum_image.h5')
+            with h5py.File(filename, 'w') as h5_file:
+                h5_file['data'] = self.data
+            with h5py.File(filename, 'r') as h5_file:
+                np.random.seed(0)
+                result = VCA_decomposition(h5_file['data'], 3, whitening=False, chunk_size=50)
+        finally:
+            shutil.rmtree(tmpdir)
+        # Without whitening, the results are data columns projected onto the sub-space:
+        T_data = self.data.reshape((-1, self.data.shape[-1])).copy()
+        _preprocess(T_data, True, True)
+        U = np.linalg.svd(T_data, full_matrices=False)[0][:, :3]
+        projected = np.dot(U, np.dot(U.T, T_data))
+        for i in range(3):
+            error = np.abs(projected - result[:, i:i+1]).max(axis=0).min()
+            self.assertLess(error, 1e-10)
+
+    def test_VCA_decomposition_h5py_signal(self):
+        # Signals holding an h5py dataset have to be processed out-of-core, like the dataset:
+        tmpdir = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(tmpdir, 'spectrum_image.h5')
+            with h5py.File(filename, 'w') as h5_file:
+                h5_file['data'] = self.data
+            with h5py.File(filename, 'r') as h5_file:
+                signal = SignalLike(h5_file['data'])
+                for chunk_size in [None, 50]:
+                    result = VCA_decomposition(signal, 3, seed=0, chunk_size=chunk_size)
+                    result_ref = VCA_decomposition(h5_file['data'], 3, seed=0,
+                                                   chunk_size=chunk_size)
+                    assert_array_equal(result, result_ref)
+        finally:
+            shutil.rmtree(tmpdir)
+        result = VCA_decomposition(SignalLike(self.data), 3, seed=0, chunk_size=50)
+        self.assertEqual(result.shape, (400, 3))
+
+    def test_VCA_decomposition_seed(self):
+        result_1 = VCA_decomposition(self.data, 3, seed=7)
+        result_2 = VCA_decomposition(self.data, 3, seed=7)
+        assert_array_equal(result_1, result_2)
+        result_restarts = VCA_decomposition(self.data, 3, seed=7, n_restarts=16)
+        self.assertEqual(result_restarts.shape, (400, 3))
+        # Without seed, the global state of numpy.random is used:
+        np.random.seed(3)
+        result_1 = VCA_decomposition(self.data, 3)
+        np.random.seed(3)
+        result_2 = VCA_decomposition(self.data, 3)
+        assert_array_equal(result_1, result_2)
+        # The endmember search does not depend on the random numbers used by the SVD backend:
+        result_pixel = VCA_decomposition(self.data, 3, covariance='pixel', seed=1)
+        result_channel = VCA_decomposition(self.data, 3, covariance='channel', seed=1)
+        assert_allclose(result_pixel, result_channel, atol=1e-8)
+
+    def test_endmember_indices(self):
+        # Compare with the pseudo inverse formulation of the projection:
+        rng = np.random.RandomState(0)
+        xRot = rng.randn(4, 200)
+        A = np.zeros((4, 4))
+        A[3, 0] = 1
+        indice_ref = np.zeros(4, dtype=int)
+        rng = np.random.RandomState(1)
+        for i in range(4):
+            w = np.abs(rng.randn(1, 4)).T
+            f = w - np.dot(np.dot(A, np.linalg.pinv(A)), w)
+            indice_ref[i] = np.argmax(np.abs(np.dot(f.T, xRot)))
+            A[:, i] = xRot[:, indice_ref[i]]
+        assert_array_equal(_endmember_indices(xRot, 4, 1), indice_ref)
+        indice = _endmember_indices(xRot, 4, 1, n_restarts=32)
+        self.assertEqual(len(np.unique(indice)), 4)
+
+    def test_endmember_indices_rank_deficient(self):
+        # Only two distinct columns, the consensus has to be filled up to nbr_compo indices:
+        xRot = np.repeat([[1., -1.], [2., 1.], [0.5, 3.]], [3, 4], axis=1)
+        indice = _endmember_indices(xRot, 3, 0, n_restarts=8)
+        self.assertEqual(len(indice), 3)
+        self.assertEqual(set(indice), {0, 3})
+
+    def test_endmember_spectra(self):
+        Ae = VCA_decomposition(self.data, 3, seed=0)
+        T_data = self.data.reshape((-1, self.data.shape[-1]))
+        assert_allclose(endmember_spectra(self.data, Ae, chunk_size=64),
+                        np.dot(np.linalg.pinv(Ae), T_data), atol=1e-10)
+
+    def test_abundance_maps(self):
+        data = self.data - 1  # remove offset
+        maps = abundance_maps(data, self.endmembers, 'unconstrained')
+        self.assertEqual(maps.shape, (3, 20, 20))
+        assert_allclose(maps.reshape((3, -1)).T, self.abundances, atol=0.05)
+        maps = abundance_maps(data, self.endmembers, 'sum_to_one')
+        assert_allclose(maps.sum(axis=0), 1)
+        maps = abundance_maps(data, self.endmembers, 'fcls', n_jobs=2, chunk_size=100)
+        assert_allclose(maps.sum(axis=0), 1)
+        self.assertGreaterEqual(maps.min(), 0)
+
+    def test_abundance_maps_nnls(self):
+        endmembers = self.endmembers - 0.5  # make sure the constraint is active
+        T_data = self.data.reshape((-1, self.data.shape[-1]))
+        maps_ref = np.array([nnls(endmembers.T, spectrum)[0] for spectrum in T_data])
+        maps = abundance_maps(self.data, endmembers, 'nnls', max_iter=5000, tol=1e-12)
+        assert_allclose(maps.reshape((3, -1)).T, maps_ref, atol=1e-6)
+
+    def test_estimate_nbr_compo(self):
+        nbr_compo, ratio = estimate_nbr_compo(self.data, 99.99, max_compo=10, seed=0)
+        self.assertEqual(nbr_compo, 3)
+        self.assertEqual(ratio.shape, (10,))
+        nbr_compo, _ = estimate_nbr_compo(self.data, criterion='noise', seed=0)
+        self.assertEqual(nbr_compo, 3)
+
+    def test_nbr_compo_conventions(self):
+        # Nbr_compotokeep returns the index of the last component, estimate_nbr_compo the number:
+        nbr_compo, ratio = estimate_nbr_compo(self.data, 99.99, max_compo=10, seed=0)
+        signal = DecomposedSignal(np.diff(np.concatenate(([0], ratio))))
+        self.assertEqual(Nbr_compotokeep(signal, 99.99), nbr_compo - 1)
+        self.assertEqual(Nbr_compotokeep(DecomposedSignal(np.array([.6, .3, .09, .01])), 95), 2)
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestCaseVCA)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""Testcase for the EMD class."""
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import h5py
+from numpy.testing import assert_array_equal
+
+from ercpy.formats.emd import EMD, EMDStreamWriter, RawSignal
+from ercpy.formats.emd import _default_chunks, _write_dataset, _normalize_roi
+from ercpy.formats.semper import SemperFormat
+
+
+def write_emd(filename, signals):
+    """Write a minimal emd-file (without hyperspy) with 2D signals given as {name: data}."""
+    with h5py.File(filename, 'w') as emd_file:
+        emd_file.create_group('microscope').attrs['name'] = 'Titan'
+        emd_file.create_group('sample').attrs['material'] = 'Si3N4'
+        data_group = emd_file.create_group('data')
+        for name, data in signals.items():
+            group = data_group.create_group(name)
+            group.attrs['emd_group_type'] = 1
+            group.attrs['record_by'] = 'image'
+            group['data'] = data
+            for i, (offset, scale) in enumerate([(1., 0.5), (-2., 0.25)][:data.ndim]):
+                dim = group.create_dataset('dim{}'.format(i+1), data=[offset, offset+scale])
+                dim.attrs['name'] = 'xy'[i]
+                dim.attrs['units'] = '[n_m]'
+
+
+class TestCaseEMD(unittest.TestCase):
+    """TestCase for reading emd-files."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'test.emd')
+        self.data = np.arange(12, dtype=np.float32).reshape((3, 4))
+        write_emd(self.filename, {'phase': self.data})
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_read_header(self):
+        header = EMD.read_header(self.filename)
+        self.assertEqual(header['microscope'], {'name': 'Titan'})
+        signal = header['signals']['phase']
+        self.assertEqual(signal['shape'], (3, 4))
+        self.assertEqual(signal['dtype'], 'float32')
+        self.assertEqual(signal['axes'][1], {'name': 'y', 'units': 'nm', 'scale': .25,
+                                             'offset': -2., 'size': 4})
+
+    def test_load_lazy(self):
+        with EMD.load_from_emd(self.filename, lazy=True) as emd:
+            self.assertEqual(emd.microscope['name'], 'Titan')
+            self.assertEqual(list(emd.data.keys()), ['phase'])
+            self.assertFalse(emd.data.is_loaded('phase'))
+            self.assertTrue(emd._emd_file)
+        self.assertIsNone(emd._emd_file)
+        self.assertRaises(IOError, emd.data.__getitem__, 'phase')
+
+    def test_default_chunks(self):
+        self.assertEqual(_default_chunks((100, 100, 2048), 1, 8), (1, 64, 2048))
+        self.assertEqual(_default_chunks((50, 256, 256), 2, 4), (4, 256, 256))
+        self.assertEqual(_default_chunks((2, 4096, 4096), 2, 4), (1, 512, 512))
+        self.assertEqual(_default_chunks((10, 10), 2, 8), (10, 10))
+
+    def test_write_dataset(self):
+        data = np.random.RandomState(0).rand(8, 16, 16)
+        with h5py.File(os.path.join(self.tmpdir, 'chunks.h5'), 'w') as h5_file:
+            dataset = _write_dataset(h5_file, 'data', data, 2, compression='gzip', shuffle=True,
+                                     dtype='float32')
+            self.assertEqual(dataset.chunks, (8, 16, 16))
+            self.assertEqual(dataset.compression, 'gzip')
+            self.assertTrue(dataset.shuffle)
+            assert_array_equal(dataset[...], data.astype(np.float32))
+            dataset = _write_dataset(h5_file, 'contiguous', data, 2, chunks=None)
+            self.assertIsNone(dataset.chunks)
+
+    def test_normalize_roi(self):
+        self.assertEqual(_normalize_roi(-1, (4, 5)), (3, slice(0, 5, 1)))
+        self.assertEqual(_normalize_roi((Ellipsis, slice(1, None, 2)), (4, 5, 6)),
+                         (slice(0, 4, 1), slice(0, 5, 1), slice(1, 6, 2)))
+        self.assertRaises(IndexError, _normalize_roi, 4, (4, 5))
+        self.assertRaises(AssertionError, _normalize_roi, slice(None, None, -1), (4,))
+
+    def test_read_group_roi(self):
+        with h5py.File(self.filename, 'r') as emd_file:
+            data, axes, _ = EMD._read_group(emd_file['data']['phase'], (1, slice(1, 4, 2)))
+        assert_array_equal(data, self.data[1, 1:4:2])
+        self.assertEqual(len(axes), 1)
+        self.assertEqual((axes[0]['offset'], axes[0]['scale']), (-1.75, .5))
+
+    def test_stream_writer(self):
+        frames = np.random.RandomState(0).rand(5, 3, 4)
+        with EMDStreamWriter(self.filename, 'series', (3, 4), 'float64') as writer:
+            writer.append(frames[0])
+            writer.append(frames[1:])
+            self.assertEqual(len(writer), 5)
+        header = EMD.read_header(self.filename)
+        self.assertEqual(header['signals']['series']['shape'], (5, 3, 4))
+        self.assertEqual(header['signals']['phase']['shape'], (3, 4))  # untouched!
+        with h5py.File(self.filename, 'r') as emd_file:
+            assert_array_equal(emd_file['data/series/data'][...], frames)
+
+    def test_update_metadata(self):
+        emd = EMD(data={}, user={}, microscope={'name': 'Krios', 'voltage': 300},
+                  sample={'material': 'SrTiO3', 'preparation': 'FIB'}, comments={})
+        emd.save_metadata_to_emd(self.filename)
+        emd.save_to_emd(self.filename, mode='a')  # no signals, nothing is replaced!
+        header = EMD.read_header(self.filename)
+        self.assertEqual(header['microscope'], {'name': 'Krios', 'voltage': 300})
+        self.assertEqual(header['sample'], {'material': 'SrTiO3', 'preparation': 'FIB'})
+        self.assertEqual(header['signals']['phase']['shape'], (3, 4))
+
+    def test_load_raw(self):
+        with EMD.load_from_emd(self.filename, lazy=True, raw=True) as emd:
+            signal = emd.data['phase']
+            self.assertTrue(emd.data.is_loaded('phase'))
+        self.assertIsInstance(signal, RawSignal)
+        assert_array_equal(signal.data, self.data)
+        self.assertEqual(signal.axes[0]['units'], 'nm')
+        self.assertEqual(signal.signal_ndim, 2)
+        self.assertEqual(emd.sample['material'], 'Si3N4')
+        signal = EMD.load_slice(self.filename, 'phase', (Ellipsis, slice(2, None)), raw=True)
+        assert_array_equal(signal.data, self.data[:, 2:])
+        self.assertEqual(signal.axes[1]['offset'], -1.5)
+
+    def test_save_raw(self):
+        emd = EMD.load_from_emd(self.filename, raw=True)
+        emd.add_signal('copy', RawSignal('', self.data[::-1], metadata={'record_by': 'image'}))
+        filename = os.path.join(self.tmpdir, 'raw.emd')
+        emd.save_to_emd(filename, compression='lzf')
+        emd_loaded = EMD.load_from_emd(filename, raw=True)
+        self.assertEqual(sorted(emd_loaded.data.keys()), ['copy', 'phase'])
+        assert_array_equal(emd_loaded.data['copy'].data, self.data[::-1])
+        self.assertEqual(emd_loaded.data['phase'].axes, emd.data['phase'].axes)
+        self.assertEqual(emd_loaded.microscope['name'], 'Titan')
+
+    def test_export_raw(self):
+        emd = EMD.load_from_emd(self.filename, raw=True)
+        filename = os.path.join(self.tmpdir, 'phase.unf')
+        emd.export_signal('phase', filename)
+        semper = SemperFormat.from_file(filename)
+        assert_array_equal(semper.data[0], self.data)
+        self.assertEqual(semper.title, 'phase')
+        self.assertEqual(semper.scales[:2], (0.25, 0.5))  # (x, y)
+
+    def test_non_uniform_axis(self):
+        energy = np.array([0., 1., 3., 6.])
+        axes = [{'name': 'x', 'units': 'nm', 'offset': 0., 'scale': 2., 'size': 3},
+                {'name': 'E', 'units': 'eV', 'values': energy}]
+        emd = EMD(data={}, user={}, microscope={}, sample={}, comments={})
+        emd._raw = True
+        emd.add_signal('eels', RawSignal('', self.data, axes=axes))
+        filename = os.path.join(self.tmpdir, 'eels.emd')
+        emd.save_to_emd(filename)
+        with h5py.File(filename, 'r') as emd_file:
+            self.assertEqual(emd_file['data/eels/dim1'].shape, (2,))
+        axes = EMD.read_calibration(filename, 'eels')
+        self.assertEqual((axes[0]['scale'], axes[0]['size']), (2., 3))
+        self.assertNotIn('values', axes[0])
+        assert_array_equal(axes[1]['values'], energy)
+        signal = EMD.load_slice(filename, 'eels', (Ellipsis, slice(1, None)), raw=True)
+        assert_array_equal(signal.axes[1]['values'], energy[1:])
+        self.assertEqual((signal.axes[1]['offset'], signal.axes[1]['size']), (1., 3))
+
+    def test_roi_from_values(self):
+        axes = EMD.read_calibration(self.filename, 'phase')
+        self.assertEqual(EMD.roi_from_values(axes, 2., (-1.8, -1.2)), (2, slice(1, 4)))
+        self.assertEqual(EMD.roi_from_values(axes, None, 100.), (slice(None), 3))
+        self.assertEqual(EMD.roi_from_values(axes, 1.), (0,))
+        axes[1]['values'] = np.array([0., 1., 3., 6.])
+        self.assertEqual(EMD.roi_from_values(axes, None, (2.1, 4.6)), (slice(None), slice(2, 4)))
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestCaseEMD)
+    unittest.TextTestRunner(verbosity=2).run(suite)
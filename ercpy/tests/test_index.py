@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""Testcase for the index module."""
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import h5py
+
+from ercpy.formats.index import FileIndex
+from ercpy.formats.semper import SemperFormat
+
+from test_semper import semper_object
+
+
+class TestCaseFileIndex(unittest.TestCase):
+    """TestCase for the header-only file index."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.tmpdir, 'session'))
+        for i, iform in enumerate([1, 2]):
+            data = np.zeros((1, 5, 7), dtype=SemperFormat.IFORM_DICT[iform])
+            filename = os.path.join(self.tmpdir, 'session', 'holo_{}.unf'.format(i))
+            semper_object(data, iform, title='hologram_{}'.format(i)).to_file(filename)
+        with h5py.File(os.path.join(self.tmpdir, 'collection.emd'), 'w') as emd_file:
+            emd_file.create_group('microscope').attrs['name'] = 'Titan'
+            group = emd_file.create_group('data').create_group('phase')
+            group.attrs['emd_group_type'] = 1
+            group['data'] = np.zeros((3, 4), dtype=np.float64)
+            group['dim1'] = [0., 0.5]
+            group['dim2'] = [0., 0.5]
+        open(os.path.join(self.tmpdir, 'notes.txt'), 'w').close()
+        self.index = FileIndex(':memory:')
+
+    def tearDown(self):
+        self.index.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_scan_query(self):
+        self.assertEqual(self.index.scan(self.tmpdir), (3, 0))
+        self.assertEqual(len(self.index), 3)
+        self.assertEqual(len(self.index.query(file_format='semper')), 2)
+        paths = self.index.query(title='hologram_%', dtype='float32')
+        self.assertEqual(paths, [os.path.join(self.tmpdir, 'session', 'holo_1.unf')])
+        paths = self.index.query(microscope='Titan', shape=(3, 4))
+        self.assertEqual(paths, [os.path.join(self.tmpdir, 'collection.emd')])
+        entry, = self.index.entries(paths[0])
+        self.assertEqual(entry['name'], 'phase')
+        self.assertEqual(entry['scales'], [0.5, 0.5])
+
+    def test_rescan(self):
+        self.index.scan(self.tmpdir)
+        self.assertEqual(self.index.scan(self.tmpdir), (0, 0))
+        self.assertEqual(self.index.scan(self.tmpdir, rescan=True), (3, 0))
+        os.remove(os.path.join(self.tmpdir, 'session', 'holo_0.unf'))
+        self.assertEqual(self.index.scan(self.tmpdir), (0, 1))
+        self.assertEqual(len(self.index), 2)
+
+    def test_unindexed_files(self):
+        self.index.scan(self.tmpdir)
+        filename = os.path.join(self.tmpdir, 'session', 'holo_0.unf')
+        with open(filename, 'r+b') as f:
+            f.truncate(10)  # broken header!
+        os.utime(filename, (0, 0))
+        with h5py.File(os.path.join(self.tmpdir, 'empty.emd'), 'w') as emd_file:
+            emd_file.create_group('data')
+        self.assertEqual(self.index.scan(self.tmpdir), (1, 0))  # only the empty emd-file
+        self.assertEqual(self.index.entries(filename), [])  # stale entry of the broken file
+        self.assertEqual(len(self.index), 2)
+        read_paths = []
+        read_rows = self.index._read_rows
+
+        def counting_read_rows(path, *args):
+            read_paths.append(path)
+            return read_rows(path, *args)
+        self.index._read_rows = counting_read_rows
+        self.assertEqual(self.index.scan(self.tmpdir), (0, 0))
+        self.assertEqual(read_paths, [])  # failed and empty files are not read again!
+        os.remove(filename)
+        self.assertEqual(self.index.scan(self.tmpdir), (0, 1))
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestCaseFileIndex)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""Testcase for the lazy loading of the ercpy package."""
+
+
+import os
+import sys
+import subprocess
+import unittest
+import importlib
+
+import ercpy
+import ercpy.formats
+
+
+class TestCaseLazy(unittest.TestCase):
+    """TestCase for the lazy imports of subpackages and modules."""
+
+    def test_exports(self):
+        # The exported names have to match the __all__ of the submodules:
+        for package in [ercpy, ercpy.formats]:
+            for submodule, names in package._EXPORTS.items():
+                module = importlib.import_module('.' + submodule, package.__name__)
+                self.assertEqual(sorted(module.__all__), sorted(names))
+                for name in names:
+                    self.assertIs(getattr(package, name), getattr(module, name))
+
+    def test_import_is_lazy(self):
+        code = ('import sys; import ercpy; from ercpy.formats import SemperFormat; '
+                "print([m for m in ['matplotlib', 'scipy', 'h5py', 'skimage', 'IPython', "
+                "'ercpy.mtools', 'ercpy.formats.emd'] if m in sys.modules])")
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join([os.path.dirname(os.path.dirname(ercpy.__file__)),
+                                             env.get('PYTHONPATH', '')])
+        output = subprocess.check_output([sys.executable, '-c', code], env=env)
+        self.assertEqual(output.strip(), '[]')
+
+    def test_missing_attribute(self):
+        self.assertRaises(AttributeError, getattr, ercpy, 'does_not_exist')
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestCaseLazy)
+    unittest.TextTestRunner(verbosity=2).run(suite)
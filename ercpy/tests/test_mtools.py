@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""Testcase for the mtools module."""
+
+
+import unittest
+
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from ercpy.mtools import rm_duds
+
+
+class TestCaseRmDuds(unittest.TestCase):
+    """TestCase for the dud pixel removal."""
+
+    def setUp(self):
+        rng = np.random.RandomState(42)
+        self.img = rng.poisson(100, (32, 32)).astype(np.float64)
+        self.img[10, 10] = 5000.
+
+    def test_rm_duds_image(self):
+        img_nodud, duds = rm_duds(self.img.copy())
+        self.assertTrue(duds[10, 10])
+        self.assertLess(img_nodud[10, 10], 200)
+
+    def test_rm_duds_out(self):
+        img = self.img.copy()
+        out = np.empty_like(img)
+        img_nodud, duds = rm_duds(img, out=out)
+        self.assertIs(img_nodud, out)
+        assert_array_equal(img, self.img)
+
+    def test_rm_duds_stack(self):
+        stack = np.array([self.img, self.img, self.img])
+        dud_map = np.zeros((32, 32), dtype=bool)
+        dud_map[0, 0] = True
+        stack_nodud, duds = rm_duds(stack, dud_map=dud_map)
+        assert_array_equal(duds[:, 10, 10], True)
+        assert_array_equal(duds[:, 0, 0], True)
+
+    def test_rm_duds_spectrum(self):
+        spectrum = np.ones(100)
+        spectrum[50] = 1000.
+        spectrum_nodud, duds = rm_duds(spectrum)
+        self.assertEqual(duds.sum(), 1)
+        self.assertEqual(spectrum_nodud[50], 1.)
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestCaseRmDuds)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""Testcase for the processing pipeline."""
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import h5py
+from numpy.testing import assert_array_equal
+
+from ercpy.pipeline import Pipeline
+
+from test_semper import semper_object
+
+
+def scale_and_sum(frame, factor=1.):
+    return frame*factor, frame.sum()
+
+
+def first(result):
+    return result[0]
+
+
+def second(result):
+    return result[1]
+
+
+def fail_on_negative(frame):
+    assert frame.min() >= 0, 'Negative frame!'
+    return frame
+
+
+class TestCasePipeline(unittest.TestCase):
+    """TestCase for the Pipeline class."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.stack = np.random.RandomState(0).rand(10, 4, 5).astype(np.float32)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_collect(self):
+        pipeline = Pipeline(self.stack, n_workers=3).map(scale_and_sum, factor=2.)
+        results = list(pipeline.map(second))
+        assert_array_equal(results, self.stack.sum(axis=(1, 2)))
+        for n_workers, processes in [(1, False), (3, False), (2, True)]:
+            pipeline = Pipeline(self.stack, n_workers=n_workers, processes=processes)
+            stack = pipeline.map(scale_and_sum, 2.).map(first).collect()
+            assert_array_equal(stack, self.stack*2)
+        self.assertEqual(len(pipeline.stages), 0)  # map does not change the pipeline!
+
+    def test_errors(self):
+        stack = self.stack.copy()
+        stack[7] *= -1
+        pipeline = Pipeline(stack, n_workers=2, max_queued=3).map(fail_on_negative)
+        self.assertRaises(AssertionError, pipeline.collect)
+        self.assertRaises(AssertionError, Pipeline, stack, n_workers=4, max_queued=2)
+        pipeline = Pipeline(stack, n_workers=2, processes=True).map(lambda frame: frame)
+        self.assertRaises(TypeError, pipeline.collect)
+
+    def test_files_to_emd(self):
+        filenames = []
+        for i, frame in enumerate(self.stack):
+            filenames.append(os.path.join(self.tmpdir, 'frame_{:02}.unf'.format(i)))
+            semper_object(frame[np.newaxis]).to_file(filenames[-1])
+        pipeline = Pipeline.from_files(os.path.join(self.tmpdir, '*.unf'), n_workers=2)
+        filename = os.path.join(self.tmpdir, 'stack.emd')
+        n_frames = pipeline.map(scale_and_sum).map(first).save_to_emd(
+            filename, 'stack', metadata={'record_by': 'image'}, compression='lzf')
+        self.assertEqual(n_frames, 10)
+        with h5py.File(filename, 'r') as emd_file:
+            assert_array_equal(emd_file['data/stack/data'][...], self.stack)
+            self.assertEqual(emd_file['data/stack'].attrs['record_by'], 'image')
+
+    def test_from_files_relative(self):
+        for i, frame in enumerate(self.stack[:3]):
+            filename = os.path.join(self.tmpdir, 'frame_{}.unf'.format(i))
+            semper_object(frame[np.newaxis]).to_file(filename)
+        cwd = os.getcwd()
+        os.chdir(self.tmpdir)
+        try:
+            pipeline = Pipeline.from_files('frame_*.unf', n_workers=2)
+        finally:
+            os.chdir(cwd)  # the files are found although the working directory changed!
+        self.assertTrue(all(os.path.isabs(filename) for filename in pipeline.source))
+        assert_array_equal(pipeline.collect(), self.stack[:3])
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestCasePipeline)
+    unittest.TextTestRunner(verbosity=2).run(suite)
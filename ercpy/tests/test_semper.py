@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""Testcase for the SemperFormat class."""
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from ercpy.formats.semper import SemperFormat
+
+
+def semper_object(data, iform=None, title='test'):
+    # Shared by the other testcases (imported from this module), iform is derived from the dtype:
+    if iform is None:
+        iform = SemperFormat.IFORM_DICT_INV[data.dtype.type]
+    arg_dict = {'data': data, 'title': title, 'offsets': (0., 1., 2.),
+                'scales': (1., .5, .25), 'units': ('nm', 'nm', ''), 'date': '2015-09-21 13:30:50',
+                'ICLASS': 1, 'IFORM': iform, 'IVERSN': 2, 'ILABEL': 1, 'IFORMAT': None, 'IWP': 0,
+                'IPLTYP': 248, 'ICCOLN': 3, 'ICROWN': 2, 'ICLAYN': 1}
+    return SemperFormat(arg_dict)
+
+
+class TestCaseSemperFormat(unittest.TestCase):
+    """TestCase for reading and writing `.unf`-files."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        rng = np.random.RandomState(42)
+        self.data = {1: rng.randint(-100, 100, (2, 5, 7)).astype(np.int32),
+                     2: rng.rand(2, 5, 7).astype(np.float32),
+                     3: (rng.rand(2, 5, 7) + 1j*rng.rand(2, 5, 7)).astype(np.complex64)}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_to_file_size(self):
+        filename = os.path.join(self.tmpdir, 'test.unf')
+        semper = semper_object(self.data[3], 3)
+        semper.to_file(filename)
+        size_header = (4+12+4) + (4+4+4) + (4+512+4)  # header, title, label
+        size_data = 2*5*(4+8*7+4)
+        self.assertEqual(os.path.getsize(filename), size_header+size_data)
+
+    def test_roundtrip(self):
+        for iform, data in self.data.items():
+            filename = os.path.join(self.tmpdir, 'test_{}.unf'.format(iform))
+            semper_object(data, iform).to_file(filename)
+            semper = SemperFormat.from_file(filename)
+            assert_array_equal(semper.data, data)
+            self.assertEqual(semper.title, 'test')
+            self.assertEqual(semper.iform, iform)
+            self.assertEqual(semper.scales, (1., .5, .25))
+
+    def test_read_header(self):
+        filename = os.path.join(self.tmpdir, 'test.unf')
+        semper_object(self.data[2], 2).to_file(filename)
+        header = SemperFormat.read_header(filename)
+        self.assertEqual(header['shape'], (2, 5, 7))
+        self.assertEqual(header['title'], 'test')
+        self.assertEqual(header['date'], '2015-9-21 13:30:50')
+        self.assertEqual(header['units'], ('nm', 'nm', ''))
+        self.assertEqual(header['offsets'], (0., 1., 2.))
+        self.assertEqual((header['ICCOLN'], header['ICROWN'], header['ICLAYN']), (3, 2, 1))
+
+    def test_roundtrip_empty_title(self):
+        filename = os.path.join(self.tmpdir, 'test.unf')
+        semper_object(self.data[1], 1, title='').to_file(filename)
+        # No title record for an empty title (the reader only expects it if ntitle > 0):
+        size_header = (4+12+4) + (4+512+4)  # header, label
+        size_data = 2*5*(4+4*7+4)
+        self.assertEqual(os.path.getsize(filename), size_header+size_data)
+        semper = SemperFormat.from_file(filename)
+        self.assertEqual(semper.title, '')
+        assert_array_equal(semper.data, self.data[1])
+
+    def test_from_file_lazy(self):
+        filename = os.path.join(self.tmpdir, 'test.unf')
+        semper_object(self.data[3], 3).to_file(filename)
+        semper = SemperFormat.from_file(filename, lazy=True)
+        self.assertIsInstance(semper.data.base, np.memmap)
+        self.assertFalse(semper.data.flags.writeable)
+        assert_array_equal(semper.data, self.data[3])
+        semper = SemperFormat.from_file(filename)
+        self.assertTrue(semper.data.flags.c_contiguous)
+
+    def test_from_file_corrupted(self):
+        filename = os.path.join(self.tmpdir, 'test.unf')
+        semper_object(self.data[2], 2).to_file(filename)
+        with open(filename, 'r+b') as f:
+            f.seek(-4, os.SEEK_END)
+            f.write(b'\x00\x00\x00\x00')  # Corrupt last record length marker!
+        self.assertRaises(AssertionError, SemperFormat.from_file, filename)
+        semper = SemperFormat.from_file(filename, validate=False)
+        assert_array_equal(semper.data, self.data[2])
+        self.assertRaises(AssertionError, SemperFormat.from_file, filename, lazy=True)
+
+    def test_from_file_lazy_validation(self):
+        filename = os.path.join(self.tmpdir, 'test.unf')
+        semper_object(self.data[2], 2).to_file(filename)
+        with open(filename, 'r+b') as f:
+            f.seek(-4-36, os.SEEK_END)  # records of float32 rows with 7 columns have 36 bytes
+            f.write(b'\x00\x00\x00\x00')  # Corrupt the end marker of an inner row!
+        self.assertRaises(AssertionError, SemperFormat.from_file, filename)
+        semper = SemperFormat.from_file(filename, lazy=True)  # only outermost markers checked
+        assert_array_equal(semper.data[:, :-1], self.data[2][:, :-1])
+
+    def test_to_file_invalid_label(self):
+        filename = os.path.join(self.tmpdir, 'test.unf')
+        semper = semper_object(self.data[2], 2, title='t'*145)
+        self.assertRaises(ValueError, semper.to_file, filename)
+        semper.title = 't'*144
+        semper.to_file(filename)
+        self.assertEqual(SemperFormat.from_file(filename).title, 't'*144)
+        semper.date = '15-09-21 13:30:50'  # two digit year would wrap around!
+        self.assertRaises(ValueError, semper.to_file, filename)
+        semper.date = '2015-09-21 13:30:50'
+        semper.units = ('nm', 'micron', '')
+        self.assertRaises(ValueError, semper.to_file, filename)
+        semper.to_file(filename, skip_header=True)  # no label, nothing truncated
+
+    def test_load_stack(self):
+        for i in range(3):
+            filename = os.path.join(self.tmpdir, 'frame_{}.unf'.format(i))
+            semper_object(self.data[2][i % 2:i % 2+1], 2).to_file(filename)
+        semper = SemperFormat.load_stack(os.path.join(self.tmpdir, 'frame_*.unf'), n_threads=2,
+                                         as_signal=False)
+        assert_array_equal(semper.data, self.data[2][[0, 1, 0]])
+        self.assertEqual(semper.scales, (1., .5, .25))
+        semper_object(self.data[1][:1], 1).to_file(os.path.join(self.tmpdir, 'frame_3.unf'))
+        self.assertRaises(AssertionError, SemperFormat.load_stack,
+                          os.path.join(self.tmpdir, 'frame_*.unf'), as_signal=False)
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestCaseSemperFormat)
+    unittest.TextTestRunner(verbosity=2).run(suite)
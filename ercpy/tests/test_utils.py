@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""Testcase for the utils module."""
+
+
+import unittest
+import warnings
+
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from ercpy.utils import unfold, fold
+
+
+class TestCaseUnfold(unittest.TestCase):
+    """TestCase for unfolding and folding of N-D data."""
+
+    def setUp(self):
+        self.data = np.arange(2*3*4*5.).reshape((2, 3, 4, 5))
+
+    def test_unfold_view(self):
+        data_2D = unfold(self.data)
+        self.assertEqual(data_2D.shape, (24, 5))
+        self.assertTrue(np.may_share_memory(data_2D, self.data))
+        self.assertEqual(unfold(self.data, signal_ndim=2).shape, (6, 20))
+
+    def test_unfold_copy(self):
+        data_2D = unfold(self.data, copy=True)
+        self.assertFalse(np.may_share_memory(data_2D, self.data))
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            data_2D = unfold(self.data.transpose((1, 0, 2, 3)))
+        self.assertEqual(len(caught), 1)
+        self.assertEqual(data_2D.shape, (24, 5))
+
+    def test_fold(self):
+        data_2D = unfold(self.data)
+        assert_array_equal(fold(data_2D, (2, 3, 4)), self.data)
+        self.assertEqual(fold(data_2D[:, :2], (2, 3, 4)).shape, (2, 3, 4, 2))
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestCaseUnfold)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -1,12 +1,10 @@
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.patches import Rectangle
-from skimage import draw
 # import matplotlib.cm as cm
 import sys
 import io
 import os
-from IPython.nbformat.current import read, write
+import warnings
+# matplotlib, skimage and IPython are imported where they are used (fast import of ercpy)!
 
 class RoiRect(object):
     ''' Class for getting a mouse drawn rectangle
@@ -18,6 +16,8 @@ class RoiRect(object):
     
     '''
     def __init__(self):
+        import matplotlib.pyplot as plt
+        from matplotlib.patches import Rectangle
         self.ax = plt.gca()
         self.rect = Rectangle((0,0), 1, 1,fc='none', ec='r')
         self.x0 = None
@@ -72,6 +72,7 @@ class RoiPoint(object):
     
     '''
     def __init__(self):
+        import matplotlib.pyplot as plt
         self.ax = plt.gca()
 #        self.rect = Rectangle((0,0), 1, 1,fc='none', ec='r')
         self.x0 = None
@@ -175,6 +176,7 @@ def poly_to_mask(vertex_row_coords, vertex_col_coords, shape):
     '''
     Creates a poligon mask
     '''
+    from skimage import draw
     fill_row_coords, fill_col_coords = draw.polygon(vertex_row_coords, vertex_col_coords, shape)
     mask = np.zeros(shape, dtype=np.bool)
     mask[fill_row_coords, fill_col_coords] = True
@@ -202,25 +204,96 @@ def wrap(angle):
     '''
     return angle % (2 * np.pi )
 
+
 def hspy_to_2Dnp(hyperspy_signal):
     """
-    Transform the 2D and 3D hyperspy.data in a 2D numpy array, with the 2nd dimension being the signal dimension
+    Transform the N-D hyperspy.data in a 2D numpy array, with the 2nd dimension being the signal
+    dimension (a view of the signal data if possible, see unfold)
+    """
+    return unfold(hyperspy_signal)
+
+
+def unfold(data, signal_ndim=None, copy=False):
+    """
+    Unfold N-D data in a 2D array (navigation x signal)
+
+    Parameters
+    ----------
+    data : hyperspy signal, ndarray or dask array
+        The data, navigation axes first and signal axes last (hyperspy convention)
+    signal_ndim : int, optional
+        Number of signal axes, taken from the axes_manager of hyperspy signals, default is 1
+        for arrays
+    copy : boolean, optional
+        Set True to always return a copy
+
+    Returns
+    -------
+    data_2D : ndarray or dask array
+        Array of shape (navigation size, signal size). Unless `copy` is True, this is a view of
+        the data if the memory layout allows it. Otherwise a copy is made and a warning is
+        issued, changes to the result are then not reflected in the data. Dask arrays stay lazy.
+
+    See Also
+    --------
+    fold
+
+    """
+    if hasattr(data, 'axes_manager'):  # hyperspy signal
+        if signal_ndim is None:
+            signal_ndim = data.axes_manager.signal_dimension
+        data = data.data
+    if signal_ndim is None:
+        signal_ndim = 1
+    signal_shape = data.shape[len(data.shape)-signal_ndim:]
+    shape_2D = (-1, int(np.prod(signal_shape)))
+    if not isinstance(data, np.ndarray):  # e.g. dask array, reshape lazily
+        return data.reshape(shape_2D)
+    if copy:
+        return data.reshape(shape_2D).copy()
+    data_2D = data.view()
+    try:
+        data_2D.shape = shape_2D  # raises if the data can not be reshaped without copying!
+    except AttributeError:
+        warnings.warn('Data can not be unfolded without copying (memory layout), '
+                      'changes are not reflected in the original data!')
+        data_2D = data.reshape(shape_2D)
+    return data_2D
+
+
+def fold(data_2D, navigation_shape, signal_shape=None):
     """
-    TwoDnp = np.empty([hyperspy_signal.axes_manager.navigation_size,hyperspy_signal.axes_manager.signal_size],dtype=hyperspy_signal.data.dtype)
+    Fold 2D results (navigation x signal) back to N-D (inverse of unfold)
+
+    Parameters
+    ----------
+    data_2D : ndarray or dask array
+        Array of shape (navigation size, signal size)
+    navigation_shape : tuple or hyperspy signal
+        Shape of the navigation axes (array order) or a signal with the original navigation
+    signal_shape : tuple, optional
+        Shape of the signal axes, default keeps the 2nd dimension of `data_2D`
 
-    if np.size(hyperspy_signal.data.shape)==2:
-	TwoDnp = hyperspy_signal.data
+    Returns
+    -------
+    data : ndarray or dask array
+        Array of shape navigation_shape + signal_shape (a view if possible)
 
-    if np.size(hyperspy_signal.data.shape)==3:
-	a0, b0, c0 = hyperspy_signal.data.shape
-	TwoDnp = hyperspy_signal.data.reshape(a0*b0,c0)
+    """
+    if hasattr(navigation_shape, 'axes_manager'):  # hyperspy signal
+        signal = navigation_shape
+        nav_ndim = signal.axes_manager.navigation_dimension
+        navigation_shape = signal.data.shape[:nav_ndim]
+    if signal_shape is None:
+        signal_shape = data_2D.shape[1:]
+    return data_2D.reshape(tuple(navigation_shape) + tuple(signal_shape))
 
-    return TwoDnp
 
 def remove_outputs(fname):
     """
     remove the outputs from a notebook "fname" and create a new notebook
     """
+    from IPython.nbformat.current import read, write
     with io.open(fname, 'r') as f:
 	nb = read(f, 'json')
     for ws in nb.worksheets:
@@ -87,6 +87,7 @@ setup(name=DISTNAME,
       include_dirs=[numpy.get_include()],
       requires=['numpy'],  # TODO: Add necessary packages!
       scripts=get_files('scripts'),
+      entry_points={'console_scripts': ['ercpy-convert = ercpy.formats.convert:main']},
       test_suite='nose.collector'
       )
 print '-------------------------------------------------------------------------------\n'